@@ -1,13 +1,17 @@
-import crydi.common
-import crydi.md4
-import crydi.md5
-import crydi.sha1
-import crydi.sha256
-import crydi.hmac
+import importlib
 
-common = crydi.common
-md4 = crydi.md4
-md5 = crydi.md5
-sha1 = crydi.sha1
-sha256 = crydi.sha256
-hmac = crydi.hmac
+# Submodules are imported the first time they're used, so e.g. crydi.client
+# doesn't pay for numpy and the code generation of the backends
+MODULES = (
+    'common', 'metrics', 'md4', 'md5', 'sha1', 'sha256', 'hmac', 'pure', 'batch',
+    'backends', 'stream', 'parallel', 'memo', 'dedupe', 'chunking', 'client', 'server',
+    'selftest',
+)
+
+def __getattr__(name):
+    if name in MODULES:
+        return importlib.import_module(f'crydi.{name}')
+    raise AttributeError(f"module 'crydi' has no attribute '{name}'")
+
+def __dir__():
+    return sorted(list(globals()) + list(MODULES))
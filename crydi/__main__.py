@@ -0,0 +1,172 @@
+import sys
+import time
+import argparse
+import concurrent.futures
+import crydi.hmac as hmac
+import crydi.common as common
+import crydi.stream as stream
+import crydi.backends as backends
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+ALIASES = {
+    'md4': 'MD4',
+    'md5': 'MD5',
+    'sha1': 'SHA-1',
+    'sha-1': 'SHA-1',
+    'sha256': 'SHA-256',
+    'sha-256': 'SHA-256',
+}
+# =================================================================================
+
+# =================================================================================
+# Auxiliar functions
+# =================================================================================
+def algorithm(name):
+    name = ALIASES.get(name.lower(), name)
+    if name not in backends.ALGORITHMS:
+        raise argparse.ArgumentTypeError(f'unknown algorithm {name}')
+    return name
+
+def positive(value):
+    try:
+        value = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid int value: {value!r}')
+    if value <= 0:
+        raise argparse.ArgumentTypeError('must be greater than 0')
+    return value
+
+# Chunks of a file (or stdin for '-'), read into one reused buffer
+def read_chunks(name, chunk_size, hex_input):
+    if name == '-':
+        file = open(sys.stdin.fileno(), 'rb', buffering=0, closefd=False)
+    else:
+        file = open(name, 'rb', buffering=0)
+
+    with file:
+        buffer = bytearray(chunk_size)
+        view   = memoryview(buffer)
+
+        def chunks():
+            while True:
+                size = file.readinto(buffer)
+                if not size:
+                    return
+                yield bytes(view[:size]) if hex_input else view[:size]
+
+        yield from (stream.iter_fromhex(chunks()) if hex_input else chunks())
+# =================================================================================
+
+# =================================================================================
+# Hash one input with every algorithm (and HMAC) in a single read pass
+# =================================================================================
+def hash_source(name, algorithms, key, hex_input, backend, chunk_size):
+    hashers = [(hash_fn, backends.new(hash_fn, backend=backend)) for hash_fn in algorithms]
+    if key is not None:
+        hashers += [(f'HMAC-{hash_fn}', hmac.HMAC(key, hash_fn, hex_key=False, backend=backend))
+                    for hash_fn in algorithms]
+
+    total = 0
+    start = time.perf_counter()
+    for chunk in read_chunks(name, chunk_size, hex_input):
+        total += len(chunk)
+        for _, hasher in hashers:
+            hasher.update(chunk)
+
+    digests = [(label, hasher.hexdigest()) for label, hasher in hashers]
+    return digests, total, time.perf_counter() - start
+
+def hash_source_safe(*args):
+    try:
+        return hash_source(*args), None
+    except (OSError, RuntimeError, ValueError) as error:
+        return None, error
+# =================================================================================
+
+# =================================================================================
+# Print coreutils-style lines as results arrive, in the order of the files
+# =================================================================================
+def report(files, results, tag, bench):
+    status = 0
+    total  = 0
+    start  = time.perf_counter()
+
+    for name, (result, error) in zip(files, results):
+        if error is not None:
+            print(f'crydi: {name}: {error}', file=sys.stderr)
+            status = 1
+            continue
+
+        digests, size, elapsed = result
+        total += size
+        for label, digest in digests:
+            print(f'{label} ({name}) = {digest}' if tag else f'{digest}  {name}')
+
+        if bench:
+            speed = size / max(elapsed, 1e-9) / 1e6
+            print(f'crydi: {name}: {size} bytes in {elapsed:.3f} s ({speed:.2f} MB/s)',
+                  file=sys.stderr)
+
+    if bench and len(files) > 1:
+        elapsed = time.perf_counter() - start
+        speed   = total / max(elapsed, 1e-9) / 1e6
+        print(f'crydi: total: {total} bytes in {elapsed:.3f} s ({speed:.2f} MB/s)',
+              file=sys.stderr)
+
+    return status
+# =================================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog        = 'python -m crydi',
+        description = 'Print MD4/MD5/SHA-1/SHA-256 (and HMAC) digests of files or stdin.',
+    )
+    parser.add_argument('files', nargs='*', default=['-'], metavar='FILE',
+                        help="files to hash, '-' or none for stdin")
+    parser.add_argument('-a', '--algorithm', action='append', type=algorithm, dest='algorithms',
+                        help='algorithm to use, can be repeated (default: SHA-256)')
+    parser.add_argument('-k', '--hmac-key', help='also print the HMAC of every algorithm')
+    parser.add_argument('--text-key', action='store_true', help='the key is text, not hex')
+    parser.add_argument('-x', '--hex', action='store_true', help='inputs are hex dumps')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='files hashed in parallel')
+    parser.add_argument('-b', '--backend', default='auto')
+    parser.add_argument('--chunk-size', type=positive, default=stream.CHUNK_SIZE)
+    parser.add_argument('--tag', action='store_true', help="always print 'ALG (FILE) = DIGEST'")
+    parser.add_argument('--bench', action='store_true', help='report MB/s on stderr')
+    args = parser.parse_args(argv)
+
+    algorithms = args.algorithms or ['SHA-256']
+    tag        = args.tag or len(algorithms) > 1 or args.hmac_key is not None
+
+    # The files are hashed incrementally, so the backend must support it
+    if args.backend != 'auto':
+        for hash_fn in algorithms:
+            if args.backend not in backends.available(hash_fn):
+                parser.error(f'unknown backend {args.backend} for {hash_fn} '
+                             f'(available: {", ".join(backends.available(hash_fn))})')
+            if backends.get(hash_fn, args.backend).new is None:
+                parser.error(f'backend {args.backend} of {hash_fn} is not incremental')
+
+    key = None
+    if args.hmac_key is not None:
+        if not args.hmac_key:
+            parser.error('Not given key!')
+        try:
+            key = common.to_bytes(args.hmac_key, hex_input=not args.text_key)
+        except ValueError:
+            parser.error('invalid key' if args.text_key else 'invalid hexadecimal key')
+
+    jobs = [(name, algorithms, key, args.hex, args.backend, args.chunk_size)
+            for name in args.files]
+
+    if args.jobs > 1 and '-' not in args.files:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = executor.map(hash_source_safe, *zip(*jobs))
+            return report(args.files, results, tag, args.bench)
+
+    return report(args.files, (hash_source_safe(*job) for job in jobs), tag, args.bench)
+
+if __name__ == '__main__':
+    sys.exit(main())
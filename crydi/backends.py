@@ -0,0 +1,369 @@
+import os
+import time
+import hashlib
+import crydi.md4 as md4
+import crydi.md5 as md5
+import crydi.sha1 as sha1
+import crydi.sha256 as sha256
+import crydi.pure as pure
+import crydi.batch as batch
+import crydi.common as common
+import crydi.metrics as metrics
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+ALGORITHMS = ['MD4', 'MD5', 'SHA-1', 'SHA-256']
+
+REFERENCE = {
+    'MD4': md4,
+    'MD5': md5,
+    'SHA-1': sha1,
+    'SHA-256': sha256,
+}
+
+HASHLIB_NAME = {
+    'MD4': 'md4',
+    'MD5': 'md5',
+    'SHA-1': 'sha1',
+    'SHA-256': 'sha256',
+}
+
+# Sizes (in bytes) measured by calibrate, an input uses the timings of the
+# smallest calibrated size that is not below its own size
+CALIBRATION_SIZES = (64, 1024, 8192)
+
+# Lane counts tried by calibrate_batch. digest_many sends a group of messages
+# with the same number of blocks to the batch backend from the first count at
+# which it beats the pure Python one (measured, None when it never does)
+BATCH_LANES = (8, 16, 32, 64, 128, 256)
+
+REGISTRY      = {algorithm: {} for algorithm in ALGORITHMS}
+CALIBRATION   = {}
+BATCH_MINIMUM = {}
+
+# When enabled, every digest is checked against the reference implementation
+CROSS_CHECK = os.environ.get('CRYDI_CROSS_CHECK', '') not in ('', '0')
+# =================================================================================
+
+# =================================================================================
+# A backend is one implementation of an algorithm. digest has the same
+# interface as the algorithm modules, new returns an incremental hash object
+# and digest_many hashes a list of messages at once (both are optional)
+# =================================================================================
+class Backend:
+    def __init__(self, name, digest, new=None, digest_many=None, auto=True):
+        self.name        = name
+        self.digest      = digest
+        self.new         = new
+        self.digest_many = digest_many or (lambda messages, hex_input=False, encoding='utf-8':
+                                           [digest(m, hex_input, encoding) for m in messages])
+        self.auto        = auto
+
+    def __repr__(self):
+        return f'Backend({self.name})'
+
+def register(algorithm, backend):
+    if algorithm not in REGISTRY:
+        raise RuntimeError(f'Unknown algorithm ({algorithm})')
+
+    REGISTRY[algorithm][backend.name] = backend
+    CALIBRATION.pop(algorithm, None)
+    BATCH_MINIMUM.pop(algorithm, None)
+
+def available(algorithm):
+    if algorithm not in REGISTRY:
+        raise RuntimeError(f'Unknown algorithm ({algorithm})')
+
+    return list(REGISTRY[algorithm])
+
+def set_cross_check(enabled):
+    global CROSS_CHECK
+    CROSS_CHECK = enabled
+# =================================================================================
+
+# =================================================================================
+# Measure every automatic backend of an algorithm and keep, for every size,
+# the fastest one whose output agrees with the reference implementation
+# =================================================================================
+def calibrate(algorithm=None, sizes=CALIBRATION_SIZES, repeat=3):
+    algorithms = [algorithm] if algorithm else ALGORITHMS
+    sample     = bytes(range(256)) * (max(sizes) // 256 + 1)
+    check      = sample[:100]
+
+    for algorithm in algorithms:
+        expected = REFERENCE[algorithm].digest(check)
+        correct  = [
+            backend for backend in REGISTRY[algorithm].values()
+            if backend.auto and backend.digest(check) == expected
+        ]
+
+        if not correct:
+            raise RuntimeError(f'No correct backend for {algorithm}')
+
+        table = []
+        for size in sorted(sizes):
+            data    = sample[:size]
+            timings = []
+            for backend in correct:
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    backend.digest(data)
+                timings.append((time.perf_counter() - start, backend))
+
+            # Timings grow with the size, so a backend far behind at this size
+            # won't catch up at the next ones (keeps the calibration quick)
+            best    = min(timings, key=lambda timing: timing[0])
+            correct = [backend for elapsed, backend in timings if elapsed <= 4 * best[0]]
+            table.append((size, best[1].name))
+
+        CALIBRATION[algorithm] = table
+        calibrate_batch(algorithm, repeat=repeat)
+
+    return {algorithm: CALIBRATION[algorithm] for algorithm in algorithms}
+
+# Smallest number of equally long messages for which the batch backend is
+# faster than the pure Python one
+def calibrate_batch(algorithm=None, repeat=3):
+    algorithms = [algorithm] if algorithm else ALGORITHMS
+    message    = bytes(range(100))
+
+    for algorithm in algorithms:
+        scalar = REGISTRY[algorithm].get('python')
+        vector = REGISTRY[algorithm].get('batch')
+        BATCH_MINIMUM[algorithm] = None
+        if scalar is None or vector is None:
+            continue
+
+        for lanes in BATCH_LANES:
+            messages = [message] * lanes
+            timings  = []
+            for backend in (scalar, vector):
+                best = float('inf')
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    backend.digest_many(messages)
+                    best  = min(best, time.perf_counter() - start)
+                timings.append(best)
+
+            if timings[1] < timings[0]:
+                BATCH_MINIMUM[algorithm] = lanes
+                break
+
+    return {algorithm: BATCH_MINIMUM[algorithm] for algorithm in algorithms}
+# =================================================================================
+
+# =================================================================================
+# Get a backend by name, or the fastest one for an input of size bytes
+# =================================================================================
+def get(algorithm, backend='auto', size=None):
+    if algorithm not in REGISTRY:
+        raise RuntimeError(f'Unknown algorithm ({algorithm})')
+
+    if backend != 'auto':
+        if backend not in REGISTRY[algorithm]:
+            raise RuntimeError(f'Unknown backend {backend} for {algorithm}')
+        return REGISTRY[algorithm][backend]
+
+    if algorithm not in CALIBRATION:
+        calibrate(algorithm)
+
+    table = CALIBRATION[algorithm]
+    name  = table[-1][1]
+    if size is not None:
+        name = next((name for limit, name in table if size <= limit), name)
+
+    return REGISTRY[algorithm][name]
+# =================================================================================
+
+# =================================================================================
+# Digest using the selected backend (cross-checked when CROSS_CHECK is set)
+# =================================================================================
+def digest(input_data, hash_fn, hex_input=False, encoding='utf-8', backend='auto'):
+    if backend == 'auto' or CROSS_CHECK or metrics.ENABLED:
+        input_data = common.to_bytes(input_data, hex_input, encoding)
+        hex_input  = False
+
+    start    = time.perf_counter()
+    selected = get(hash_fn, backend, len(input_data))
+    output   = selected.digest(input_data, hex_input, encoding)
+
+    if metrics.ENABLED:
+        metrics.record(hash_fn, selected.name, len(input_data), time.perf_counter() - start)
+
+    if CROSS_CHECK and selected.name != 'reference':
+        expected = REFERENCE[hash_fn].digest(input_data)
+        if output != expected:
+            raise RuntimeError(f'Backend {selected.name} of {hash_fn} gave {output}, '
+                               f'reference gave {expected}')
+
+    return output
+
+def digest_many(messages, hash_fn, hex_input=False, encoding='utf-8', backend='auto'):
+    messages = [common.to_bytes(message, hex_input, encoding) for message in messages]
+    selected = get(hash_fn, backend, max(map(len, messages), default=0))
+
+    if backend != 'auto' or selected.name != 'python':
+        return digest_group(messages, hash_fn, selected)
+
+    if hash_fn not in BATCH_MINIMUM:
+        calibrate_batch(hash_fn)
+
+    minimum = BATCH_MINIMUM[hash_fn]
+    if minimum is None or len(messages) < minimum:
+        return digest_group(messages, hash_fn, selected)
+
+    # Every lane of the batch backend is padded to the longest message, so it
+    # only gets groups of messages with the same number of blocks (once
+    # padded) that are big enough to beat the pure Python backend
+    groups = {}
+    for index, message in enumerate(messages):
+        groups.setdefault((len(message) + 8) // 64 + 1, []).append(index)
+
+    outputs = [None] * len(messages)
+    for indices in groups.values():
+        engine = get(hash_fn, 'batch') if len(indices) >= minimum else selected
+        group  = digest_group([messages[index] for index in indices], hash_fn, engine)
+        for index, output in zip(indices, group):
+            outputs[index] = output
+
+    return outputs
+
+def digest_group(messages, hash_fn, selected):
+    start   = time.perf_counter()
+    outputs = selected.digest_many(messages)
+
+    if metrics.ENABLED:
+        metrics.record(hash_fn, selected.name, sum(map(len, messages)),
+                       time.perf_counter() - start, len(messages))
+        metrics.observe('crydi_batch_size', len(messages), metrics.SIZE_BUCKETS,
+                        algorithm=hash_fn, backend=selected.name)
+
+    if CROSS_CHECK and selected.name != 'reference':
+        for message, output in zip(messages, outputs):
+            if output != REFERENCE[hash_fn].digest(message):
+                raise RuntimeError(f'Backend {selected.name} of {hash_fn} disagrees '
+                                   'with the reference')
+
+    return outputs
+
+# With metrics enabled the hash object is wrapped to record its bytes and time
+# (unless measured is False, e.g. for the inner hashes of an HMAC)
+def new(hash_fn, data=b'', backend='auto', measured=True):
+    if backend == 'auto':
+        backend = 'hashlib' if 'hashlib' in REGISTRY.get(hash_fn, {}) else 'python'
+
+    selected = get(hash_fn, backend)
+    if selected.new is None:
+        raise RuntimeError(f'Backend {selected.name} of {hash_fn} is not incremental')
+
+    if metrics.ENABLED and measured:
+        hasher = MeasuredHash(selected.new(), hash_fn, selected.name)
+        hasher.update(data)
+        return hasher
+
+    return selected.new(data)
+# =================================================================================
+
+# =================================================================================
+# Incremental hash object that adds up the bytes and time of its updates and
+# records them (as one message) the first time it's finished
+# =================================================================================
+class MeasuredHash:
+    def __init__(self, hasher, algorithm, backend):
+        self.hasher    = hasher
+        self.algorithm = algorithm
+        self.backend   = backend
+
+        self._size     = 0
+        self._elapsed  = 0.0
+        self._recorded = False
+
+    # name, block_size, digest_size... of the wrapped object
+    def __getattr__(self, name):
+        return getattr(self.hasher, name)
+
+    def update(self, data):
+        start = time.perf_counter()
+        self.hasher.update(data)
+        self._elapsed += time.perf_counter() - start
+        self._size    += memoryview(data).nbytes
+
+    def copy(self):
+        other = MeasuredHash(self.hasher.copy(), self.algorithm, self.backend)
+        other._size    = self._size
+        other._elapsed = self._elapsed
+        return other
+
+    def digest(self):
+        start  = time.perf_counter()
+        output = self.hasher.digest()
+
+        if not self._recorded:
+            self._recorded = True
+            metrics.record(self.algorithm, self.backend, self._size,
+                           self._elapsed + time.perf_counter() - start)
+        return output
+
+    def hexdigest(self):
+        return self.digest().hex()
+# =================================================================================
+
+# =================================================================================
+# Builtin backends
+# =================================================================================
+def _hashlib_backend(algorithm):
+    name = HASHLIB_NAME[algorithm]
+    try:
+        hashlib.new(name)
+    except ValueError:
+        return None
+
+    return Backend(
+        name   = 'hashlib',
+        digest = lambda input_data, hex_input=False, encoding='utf-8':
+                     hashlib.new(name, common.to_bytes(input_data, hex_input, encoding)).hexdigest(),
+        new    = lambda data=b'': hashlib.new(name, data),
+    )
+
+for _algorithm in ALGORITHMS:
+    register(_algorithm, Backend(
+        name   = 'reference',
+        digest = REFERENCE[_algorithm].digest,
+        auto   = False,
+    ))
+    register(_algorithm, Backend(
+        name   = 'python',
+        digest = lambda input_data, hex_input=False, encoding='utf-8', _algorithm=_algorithm:
+                     pure.digest(input_data, _algorithm, hex_input, encoding),
+        new    = lambda data=b'', _algorithm=_algorithm: pure.new(_algorithm, data),
+    ))
+    register(_algorithm, Backend(
+        name        = 'batch',
+        digest      = lambda input_data, hex_input=False, encoding='utf-8', _algorithm=_algorithm:
+                          batch.digest(input_data, _algorithm, hex_input, encoding),
+        digest_many = lambda messages, hex_input=False, encoding='utf-8', _algorithm=_algorithm:
+                          batch.digest_many(messages, _algorithm, hex_input, encoding),
+    ))
+
+    _backend = _hashlib_backend(_algorithm)
+    if _backend is not None:
+        register(_algorithm, _backend)
+# =================================================================================
+
+if __name__ == '__main__':
+    set_cross_check(True)
+    for algorithm in ALGORITHMS:
+        for name in available(algorithm):
+            assert(digest('abc', algorithm, backend=name) == REFERENCE[algorithm].digest('abc'))
+        assert(digest('ó' * 50, algorithm) == REFERENCE[algorithm].digest('ó' * 50))
+        assert(digest_many(['', 'abc'], algorithm)
+               == [REFERENCE[algorithm].digest(''), REFERENCE[algorithm].digest('abc')])
+
+        # Mixed lengths, split in groups of the same number of blocks
+        messages = [b'y' * 10] * 40 + [b'x' * 1000] + [b'z' * 60] * 40
+        assert(digest_many(messages, algorithm)
+               == [REFERENCE[algorithm].digest(message) for message in messages])
+
+    print(calibrate())
+    print('OK!')
@@ -0,0 +1,159 @@
+import numpy as np
+import crydi.pure as pure
+import crydi.common as common
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+MD5_T    = np.array(pure.MD5_T, dtype=np.uint32)
+SHA1_K   = np.array(pure.SHA1_K, dtype=np.uint32)
+SHA256_K = np.array(pure.SHA256_K, dtype=np.uint32)
+# =================================================================================
+
+# =================================================================================
+# Auxiliar functions, every word is an array with one lane per message
+# =================================================================================
+def rotl(x, n):
+    return (x << np.uint32(n)) | (x >> np.uint32(32 - n))
+
+def rotr(x, n):
+    return (x >> np.uint32(n)) | (x << np.uint32(32 - n))
+# =================================================================================
+
+# =================================================================================
+# Compression functions, state is a list of word arrays and X is an array of
+# shape (16, messages) with the current block of every message
+# =================================================================================
+def md4_compress(state, X):
+    a, b, c, d = state
+
+    for j in range(48):
+        if j < 16:
+            v = a + ((b & c) | (~b & d))
+        elif j < 32:
+            v = a + ((b & c) | (b & d) | (c & d)) + np.uint32(0x5a827999)
+        else:
+            v = a + (b ^ c ^ d) + np.uint32(0x6ed9eba1)
+
+        v = v + X[pure.MD4_G[j]]
+        a, d, c, b = d, c, b, rotl(v, pure.MD4_S[j >> 4][j & 3])
+
+    return [state[0] + a, state[1] + b, state[2] + c, state[3] + d]
+
+def md5_compress(state, X):
+    a, b, c, d = state
+
+    for j in range(64):
+        if j < 16:
+            v = (b & c) | (~b & d)
+        elif j < 32:
+            v = (b & d) | (c & ~d)
+        elif j < 48:
+            v = b ^ c ^ d
+        else:
+            v = c ^ (b | ~d)
+
+        v = v + a + MD5_T[j] + X[pure.MD5_G[j]]
+        a, d, c, b = d, c, b, b + rotl(v, pure.MD5_S[j >> 4][j & 3])
+
+    return [state[0] + a, state[1] + b, state[2] + c, state[3] + d]
+
+def sha1_compress(state, X):
+    W = list(X)
+    for i in range(16, 80):
+        W.append(rotl(W[i - 3] ^ W[i - 8] ^ W[i - 14] ^ W[i - 16], 1))
+
+    a, b, c, d, e = state
+
+    for j in range(80):
+        if j < 20:
+            v = (b & c) | (~b & d)
+        elif j < 40:
+            v = b ^ c ^ d
+        elif j < 60:
+            v = (b & c) | (b & d) | (c & d)
+        else:
+            v = b ^ c ^ d
+
+        v = rotl(a, 5) + v + e + SHA1_K[j // 20] + W[j]
+        a, b, c, d, e = v, a, rotl(b, 30), c, d
+
+    return [state[0] + a, state[1] + b, state[2] + c, state[3] + d, state[4] + e]
+
+def sha256_compress(state, X):
+    W = list(X)
+    for i in range(16, 64):
+        x  = W[i - 15]
+        s0 = rotr(x, 7) ^ rotr(x, 18) ^ (x >> np.uint32(3))
+        x  = W[i - 2]
+        s1 = rotr(x, 17) ^ rotr(x, 19) ^ (x >> np.uint32(10))
+        W.append(W[i - 16] + s0 + W[i - 7] + s1)
+
+    a, b, c, d, e, f, g, h = state
+
+    for j in range(64):
+        t1 = h + (rotr(e, 6) ^ rotr(e, 11) ^ rotr(e, 25)) + ((e & f) ^ (~e & g)) + SHA256_K[j] + W[j]
+        t2 = (rotr(a, 2) ^ rotr(a, 13) ^ rotr(a, 22)) + ((a & b) ^ (a & c) ^ (b & c))
+        h, g, f, e, d, c, b, a = g, f, e, d + t1, c, b, a, t1 + t2
+
+    return [s + v for s, v in zip(state, (a, b, c, d, e, f, g, h))]
+
+COMPRESS = {
+    'MD4':     md4_compress,
+    'MD5':     md5_compress,
+    'SHA-1':   sha1_compress,
+    'SHA-256': sha256_compress,
+}
+# =================================================================================
+
+# =================================================================================
+# Hash many messages at once, every message is a lane of the numpy arrays so
+# the per-step Python overhead is shared by the whole batch
+# =================================================================================
+def digest_many(messages, hash_fn, hex_input=False, encoding='utf-8'):
+    if hash_fn not in COMPRESS:
+        raise RuntimeError(f'Unknown algorithm ({hash_fn})')
+
+    messages = [common.to_bytes(message, hex_input, encoding) for message in messages]
+    if not messages:
+        return []
+
+    algorithm = pure.ALGORITHMS[hash_fn]
+    compress  = COMPRESS[hash_fn]
+    endian    = algorithm.state_fmt[0]
+
+    padded  = [message + pure.padding(algorithm, len(message)) for message in messages]
+    nblocks = np.array([len(message) // 64 for message in padded])
+
+    buffer = np.zeros((len(padded), int(nblocks.max()) * 64), dtype=np.uint8)
+    for i, message in enumerate(padded):
+        buffer[i, :len(message)] = np.frombuffer(message, dtype=np.uint8)
+
+    words = buffer.view(f'{endian}u4').astype(np.uint32)
+    words = words.reshape(len(padded), -1, 16).transpose(1, 2, 0)
+
+    state = [np.full(len(padded), word, dtype=np.uint32) for word in algorithm.initial]
+    for block in range(words.shape[0]):
+        update = compress(state, words[block])
+        if (nblocks > block).all():
+            state = update
+        else:
+            state = [np.where(nblocks > block, new, old) for new, old in zip(update, state)]
+
+    output = np.stack(state, axis=1).astype(f'{endian}u4')
+    return [row.tobytes().hex() for row in output]
+
+def digest(input_data, hash_fn, hex_input=False, encoding='utf-8'):
+    return digest_many([input_data], hash_fn, hex_input, encoding)[0]
+# =================================================================================
+
+if __name__ == '__main__':
+    assert(digest_many(['', 'a', 'abc'], 'MD4')
+           == ['31d6cfe0d16ae931b73c59d7e0c089c0', 'bde52cb31de33e46245e05fbdbd6fb24',
+               'a448017aaf21d8525fc10ae87aa6729d'])
+    assert(digest_many(['abc', 'ó' * 100], 'MD5')
+           == ['900150983cd24fb0d6963f7d28e17f72', '57d6cf95ae8b579332e97d208c569ed9'])
+    assert(digest('abc', 'SHA-1') == 'a9993e364706816aba3e25717850c26c9cd0d89d')
+    assert(digest('abc', 'SHA-256')
+           == 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad')
+    print('OK!')
@@ -0,0 +1,142 @@
+import collections
+import numpy as np
+import crydi.stream as stream
+import crydi.backends as backends
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+MIN_SIZE = 2 * 1024
+AVG_SIZE = 8 * 1024
+MAX_SIZE = 64 * 1024
+
+# Bytes handed at once to the vectorized rolling hash
+BUFFER_SIZE = 4 << 20
+
+# The Gear hash is 32 bits wide and shifts one bit per byte, so the value at a
+# position only depends on the last WINDOW bytes
+WINDOW = 32
+GEAR   = np.random.default_rng(0x63727964).integers(0, 2**32, 256, dtype=np.uint32)
+
+Chunk = collections.namedtuple('Chunk', ['offset', 'length', 'digest'])
+# =================================================================================
+
+# =================================================================================
+# Auxiliar functions
+# =================================================================================
+def top_mask(bits):
+    return np.uint32(((1 << bits) - 1) << (32 - bits))
+
+# Gear hash at every position of data, context are the bytes right before it.
+# The sum over the window is built by doubling: the hash over 2s bytes is the
+# one over s bytes plus the one s positions back shifted by s
+def rolling_hash(context, data):
+    hashes  = GEAR[np.frombuffer(context + data, dtype=np.uint8)]
+    shifted = np.zeros_like(hashes)
+
+    span = 1
+    while span < WINDOW:
+        shifted[:span] = 0
+        np.left_shift(hashes[:-span], np.uint32(span), out=shifted[span:])
+        hashes += shifted
+        span   *= 2
+
+    return hashes[len(context):]
+# =================================================================================
+
+# =================================================================================
+# Content-defined chunking (FastCDC style): a boundary is a position whose Gear
+# hash has its top bits clear, using a harder mask before the average size and
+# an easier one after it, so chunk sizes concentrate around avg_size. Every
+# chunk is hashed while its bytes are still in the buffer
+# =================================================================================
+def chunk_stream(chunks, hash_fn='SHA-256', min_size=MIN_SIZE, avg_size=AVG_SIZE,
+                 max_size=MAX_SIZE, backend='auto'):
+    if not 0 < min_size <= avg_size <= max_size:
+        raise RuntimeError(f'Invalid chunk sizes ({min_size}, {avg_size}, {max_size})')
+
+    bits   = max(avg_size.bit_length() - 1, 3)
+    mask_s = top_mask(bits + 2)
+    mask_l = top_mask(bits - 2)
+
+    context  = b''
+    position = 0
+    start    = 0
+    hasher   = backends.new(hash_fn, backend=backend)
+
+    for data in chunks:
+        if not data:
+            continue
+
+        data    = bytes(data)
+        view    = memoryview(data)
+        hashes  = rolling_hash(context, data)
+        cuts_s  = np.flatnonzero((hashes & mask_s) == 0) + position
+        cuts_l  = np.flatnonzero((hashes & mask_l) == 0) + position
+        end     = position + len(data)
+        segment = position
+
+        while True:
+            # Chunk [start, cut], as absolute offsets of its first and last byte
+            low  = start + min_size - 1
+            mid  = start + avg_size - 1
+            high = start + max_size - 1
+
+            index = np.searchsorted(cuts_s, low)
+            if index < len(cuts_s) and cuts_s[index] < mid:
+                cut = int(cuts_s[index])
+            else:
+                index = np.searchsorted(cuts_l, mid)
+                if index < len(cuts_l) and cuts_l[index] < high:
+                    cut = int(cuts_l[index])
+                else:
+                    cut = high
+
+            if cut >= end:
+                break
+
+            hasher.update(view[segment - position:cut + 1 - position])
+            yield Chunk(start, cut + 1 - start, hasher.hexdigest())
+
+            start   = cut + 1
+            segment = start
+            hasher  = backends.new(hash_fn, backend=backend)
+
+        hasher.update(view[segment - position:])
+        context  = (context + data)[-(WINDOW - 1):]
+        position = end
+
+    if position > start:
+        yield Chunk(start, position - start, hasher.hexdigest())
+
+def chunk_file(path, hash_fn='SHA-256', min_size=MIN_SIZE, avg_size=AVG_SIZE,
+               max_size=MAX_SIZE, buffer_size=BUFFER_SIZE, backend='auto'):
+    return chunk_stream(stream.iter_file(path, buffer_size), hash_fn, min_size, avg_size,
+                        max_size, backend)
+# =================================================================================
+
+if __name__ == '__main__':
+    import hashlib
+
+    data   = np.random.default_rng(0).integers(0, 256, 1 << 20, dtype=np.uint8).tobytes()
+    pieces = list(chunk_stream([data], 'MD5'))
+
+    assert(sum(piece.length for piece in pieces) == len(data))
+    assert(all(MIN_SIZE <= piece.length <= MAX_SIZE for piece in pieces[:-1]))
+    assert(all(hashlib.md5(data[p.offset:p.offset + p.length]).hexdigest() == p.digest
+               for p in pieces))
+
+    # Boundaries don't depend on how the input was split
+    split = [data[i:i + 100003] for i in range(0, len(data), 100003)]
+    assert(list(chunk_stream(split, 'MD5')) == pieces)
+
+    # even in pieces shorter than the window
+    small = data[:200000]
+    tiny  = [small[i:i + 16] for i in range(0, len(small), 16)]
+    assert(list(chunk_stream(tiny, 'MD5')) == list(chunk_stream([small], 'MD5')))
+
+    # and an insertion only changes the chunks around it
+    shifted = list(chunk_stream([data[:500000] + b'crydi' + data[500000:]], 'MD5'))
+    assert(len({p.digest for p in pieces} & {p.digest for p in shifted}) >= len(pieces) - 3)
+
+    print('OK!')
@@ -0,0 +1,141 @@
+import os
+import json
+import struct
+import socket
+import getpass
+import tempfile
+from multiprocessing import shared_memory
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+# Payloads from this size on are sent through shared memory
+SHARED_THRESHOLD = 1 << 16
+
+FRAME = struct.Struct('>I')
+# =================================================================================
+
+# =================================================================================
+# Socket of the server of this user (computed when needed, there is no getuid
+# on every platform)
+# =================================================================================
+def default_path():
+    user = os.getuid() if hasattr(os, 'getuid') else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f'crydi-{user}.sock')
+# =================================================================================
+
+# =================================================================================
+# Framing (shared with the server): every message is a 4-byte length, a JSON header and (for requests)
+# header['size'] bytes of payload unless the payload is in shared memory
+# =================================================================================
+def read_exact(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise EOFError('Connection closed in the middle of a message')
+    return data
+
+def read_frame(file):
+    prefix = file.read(FRAME.size)
+    if not prefix:
+        return None
+    if len(prefix) != FRAME.size:
+        raise EOFError('Connection closed in the middle of a message')
+
+    return json.loads(read_exact(file, FRAME.unpack(prefix)[0]))
+
+def pack_frame(message):
+    data = json.dumps(message).encode('utf-8')
+    return FRAME.pack(len(data)) + data
+
+# =================================================================================
+
+# =================================================================================
+# Client: submit sends a request without waiting, result waits for its reply.
+# Not thread-safe, use one client per thread
+# =================================================================================
+class Client:
+    def __init__(self, path=None, shared_threshold=SHARED_THRESHOLD):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError('Unix sockets are not available on this platform')
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path or default_path())
+        self.file   = self.socket.makefile('rb')
+
+        self.shared_threshold = shared_threshold
+        self._next_id = 0
+        self._replies = {}
+        self._shared  = {}
+
+    def close(self):
+        for shm in self._shared.values():
+            shm.close()
+            shm.unlink()
+
+        self._shared.clear()
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, data, hash_fn, op='digest', key=None, hex_key=True):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        data   = memoryview(data).cast('B')
+        header = {'id': self._next_id, 'op': op, 'algorithm': hash_fn, 'size': len(data)}
+        self._next_id += 1
+
+        # JSON has no bytes, a raw key travels hex-encoded
+        if isinstance(key, (bytes, bytearray, memoryview)):
+            key     = bytes(key).decode('ascii') if hex_key else bytes(key).hex()
+            hex_key = True
+
+        if key is not None:
+            header['key']     = key
+            header['hex_key'] = hex_key
+
+        if len(data) >= self.shared_threshold:
+            shm = shared_memory.SharedMemory(create=True, size=len(data))
+            shm.buf[:len(data)] = data
+            header['shm'] = shm.name
+            header['pid'] = os.getpid()
+            self._shared[header['id']] = shm
+            self.socket.sendall(pack_frame(header))
+        else:
+            self.socket.sendall(pack_frame(header) + bytes(data))
+
+        return header['id']
+
+    def result(self, request_id):
+        while request_id not in self._replies:
+            message = read_frame(self.file)
+            if message is None:
+                raise RuntimeError('Server closed the connection')
+            self._replies[message['id']] = message
+
+        message = self._replies.pop(request_id)
+        shm     = self._shared.pop(request_id, None)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+        if 'error' in message:
+            raise RuntimeError(message['error'])
+
+        return message['digest']
+
+    def digest(self, data, hash_fn):
+        return self.result(self.submit(data, hash_fn))
+
+    def digest_many(self, messages, hash_fn):
+        return [self.result(request_id) for request_id in
+                [self.submit(message, hash_fn) for message in messages]]
+
+    def hmac(self, data, hash_fn, key, hex_key=True):
+        return self.result(self.submit(data, hash_fn, 'hmac', key, hex_key))
+# =================================================================================
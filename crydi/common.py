@@ -100,6 +100,17 @@ def fromhex(hex_str):
     return [np.uint8(byte) for byte in bytes_array]
 # =================================================================================
 
+# =================================================================================
+# Get the raw bytes of an input, it can be a text, a hex string or bytes-like
+# =================================================================================
+def to_bytes(input_data, hex_input=False, encoding='utf-8'):
+    if isinstance(input_data, (bytes, bytearray, memoryview)):
+        input_data = bytes(input_data)
+        return bytes.fromhex(input_data.decode('ascii')) if hex_input else input_data
+
+    return bytes.fromhex(input_data) if hex_input else input_data.encode(encoding)
+# =================================================================================
+
 # =================================================================================
 # Receive an array of bytes, and creates the padding so the total length 
 # is congruent to rule_size[0] mod rule_size[1] (in bytes)
@@ -162,7 +173,7 @@ def append_length(words_array, length, byte_format=ByteFormat.BigEndian):
 # Perform padding, append length and transform to little if neccessary
 # =================================================================================
 def prepare_data(input_data, hex_input, word_size, byte_format, encoding='utf-8'):
-    input_data   = fromhex(input_data) if hex_input else encode(input_data, encoding)
+    input_data   = [np.uint8(byte) for byte in to_bytes(input_data, hex_input, encoding)]
     input_length = len(input_data) * 8
 
     input_data = perform_padding(input_data, start_byte=0x80, fill_byte=0x00, rule_size=(56, 64))
@@ -0,0 +1,191 @@
+import os
+import stat
+import concurrent.futures
+import crydi.stream as stream
+import crydi.backends as backends
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+# Bytes read from the start and from the end of a file in the partial stage
+PARTIAL_SIZE = 64 * 1024
+# =================================================================================
+
+# =================================================================================
+# Result of a search: groups of identical files, how much was read and the
+# files that couldn't be read (left out of the groups)
+# =================================================================================
+class DedupeResult:
+    def __init__(self):
+        self.groups      = []
+        self.skipped     = []
+        self.files       = 0
+        self.bytes_total = 0
+        self.bytes_read  = 0
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_total - self.bytes_read
+
+    @property
+    def bytes_duplicated(self):
+        return sum(os.path.getsize(group[0]) * (len(group) - 1) for group in self.groups)
+
+    def __repr__(self):
+        return (f'DedupeResult(groups={len(self.groups)}, files={self.files}, '
+                f'skipped={len(self.skipped)}, bytes_read={self.bytes_read}, '
+                f'bytes_saved={self.bytes_saved})')
+# =================================================================================
+
+# =================================================================================
+# Auxiliar functions
+# =================================================================================
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+# Digest of the first and last partial_size bytes, when the file is not bigger
+# than both blocks together the whole file is read and the digest is final
+def partial_digest(path, size, hash_fn, partial_size=PARTIAL_SIZE, backend='auto'):
+    hasher = backends.new(hash_fn, backend=backend)
+
+    with open(path, 'rb') as file:
+        if size <= 2 * partial_size:
+            hasher.update(file.read())
+            return hasher.hexdigest(), size, True
+
+        hasher.update(file.read(partial_size))
+        file.seek(size - partial_size)
+        hasher.update(file.read(partial_size))
+
+    return hasher.hexdigest(), 2 * partial_size, False
+
+def full_digest(path, size, hash_fn, backend='auto'):
+    return stream.digest_file(path, hash_fn, backend=backend), size, True
+
+# Split every group by the digest given by function, in parallel. A file that
+# can't be read is dropped from its group and returned in skipped
+def regroup(groups, jobs, function, *args):
+    regrouped  = {}
+    bytes_read = 0
+    skipped    = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(function, path, key[0], *args): (key, path)
+            for key, paths in groups.items() for path in paths
+        }
+        for future in concurrent.futures.as_completed(futures):
+            key, path = futures[future]
+            try:
+                digest, read, done = future.result()
+            except OSError:
+                skipped.append(path)
+                continue
+
+            bytes_read += read
+            regrouped.setdefault((key[0], digest, done), []).append(path)
+
+    return regrouped, bytes_read, skipped
+# =================================================================================
+
+# =================================================================================
+# Find identical files in stages: same size, same partial digest and, only for
+# the files that still collide, same full digest
+# =================================================================================
+def find_duplicates(paths, hash_fn='SHA-256', partial_size=PARTIAL_SIZE, jobs=None,
+                    backend='auto'):
+    result = DedupeResult()
+
+    # Stage 1: group by size, nothing is read. A file reached more than once
+    # (repeated or nested paths, hard links) is counted only the first time
+    groups = {}
+    seen   = set()
+    for path in iter_files(paths):
+        try:
+            info = os.lstat(path)
+        except OSError:
+            result.skipped.append(path)
+            continue
+
+        if not stat.S_ISREG(info.st_mode) or (info.st_dev, info.st_ino) in seen:
+            continue
+
+        seen.add((info.st_dev, info.st_ino))
+        result.files       += 1
+        result.bytes_total += info.st_size
+        groups.setdefault((info.st_size,), []).append(path)
+
+    groups = {key: paths for key, paths in groups.items() if len(paths) > 1}
+
+    empty = groups.pop((0,), None)
+    if empty:
+        result.groups.append(sorted(empty))
+
+    # Stage 2: first and last blocks, final for the small files
+    groups, read, skipped = regroup(groups, jobs, partial_digest, hash_fn, partial_size, backend)
+    result.bytes_read += read
+    result.skipped    += skipped
+
+    final  = [paths for key, paths in groups.items() if len(paths) > 1 and key[2]]
+    groups = {key: paths for key, paths in groups.items() if len(paths) > 1 and not key[2]}
+
+    # Stage 3: whole files
+    groups, read, skipped = regroup(groups, jobs, full_digest, hash_fn, backend)
+    result.bytes_read += read
+    result.skipped    += skipped
+
+    final += [paths for paths in groups.values() if len(paths) > 1]
+    result.groups.extend(sorted(paths) for paths in final)
+    result.groups.sort()
+    result.skipped.sort()
+
+    return result
+# =================================================================================
+
+if __name__ == '__main__':
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        contents = {
+            'a': b'x' * 300000, 'b': b'x' * 300000,
+            'c': b'x' * 299999 + b'y',
+            'd': b'small', 'e': b'small', 'f': b'other',
+        }
+        for name, data in contents.items():
+            with open(os.path.join(directory, name), 'wb') as file:
+                file.write(data)
+
+        result = find_duplicates([directory], 'MD5', partial_size=1024)
+        groups = [[os.path.basename(path) for path in group] for group in result.groups]
+
+        assert(groups == [['a', 'b'], ['d', 'e']])
+        assert(result.bytes_read == 3 * 2048 + 3 * 5 + 2 * 300000)
+        assert(result.bytes_total == 3 * 300000 + 3 * 5)
+        assert(result.bytes_saved == 300000 - 3 * 2048)
+
+        # The same files given again, or through a hard link, are not duplicates
+        first = os.path.join(directory, 'a')
+        os.link(first, os.path.join(directory, 'g'))
+        again = find_duplicates([first, directory, first], 'MD5', partial_size=1024)
+        assert(again.groups == result.groups)
+        assert(again.bytes_total == result.bytes_total)
+        os.unlink(os.path.join(directory, 'g'))
+
+        # A file that can't be read doesn't stop the search
+        def unreadable(path, *args):
+            if path.endswith('b'):
+                raise PermissionError(path)
+            return partial_digest(path, *args)
+
+        groups = {(300000,): [os.path.join(directory, name) for name in 'abc']}
+        groups, _, skipped = regroup(groups, 2, unreadable, 'MD5', 1024)
+        assert([os.path.basename(path) for path in skipped] == ['b'])
+        assert(sum(len(paths) for paths in groups.values()) == 2)
+
+    print('OK!')
@@ -1,8 +1,11 @@
+import time
 import crydi.md4 as md4
 import crydi.md5 as md5
 import crydi.sha1 as sha1
 import crydi.sha256 as sha256 
 import crydi.common as common
+import crydi.metrics as metrics
+import crydi.backends as backends
 
 HASH_FN = {
     'MD4': md4,
@@ -11,18 +14,101 @@ HASH_FN = {
     'SHA-256': sha256,
 }
 
-def digest(input_data, hash_fn, key, hex_input=False, hex_key=True, encoding='utf-8'):
+# =================================================================================
+# Streaming HMAC: the key is checked and turned into the inner and outer padded
+# blocks once, update feeds the inner hash and the digest only adds the inner
+# digest to a copy of the keyed outer hash
+# =================================================================================
+class HMAC:
+    def __init__(self, key, hash_fn, hex_key=True, encoding='utf-8', backend='auto'):
+        if not key:
+            raise RuntimeError('Not given key!')
+
+        if hash_fn not in HASH_FN:
+            raise RuntimeError(f'Unknown algorithm ({hash_fn})')
+
+        self.name       = hash_fn
+        self.encoding   = encoding
+        self.block_size = HASH_FN[hash_fn].BLOCK_SIZE
+
+        key = common.to_bytes(key, hex_key, encoding)
+        if len(key) > self.block_size:
+            key = backends.new(hash_fn, key, backend=backend, measured=False).digest()
+        key = key.ljust(self.block_size, b'\x00')
+
+        # The HMAC is recorded as a whole (message bytes and time) in digest,
+        # not the inner and outer hashes on their own
+        self._inner = backends.new(hash_fn, bytes(k ^ 0x36 for k in key), backend=backend,
+                                   measured=False)
+        self._outer = backends.new(hash_fn, bytes(k ^ 0x5c for k in key), backend=backend,
+                                   measured=False)
+
+        self._size     = 0
+        self._elapsed  = 0.0
+        self._recorded = False
+
+    def update(self, data, hex_input=False):
+        if isinstance(data, str) or hex_input:
+            data = common.to_bytes(data, hex_input, self.encoding)
+
+        if not metrics.ENABLED:
+            self._inner.update(data)
+            return self
+
+        start = time.perf_counter()
+        self._inner.update(data)
+        self._elapsed += time.perf_counter() - start
+        self._size    += memoryview(data).nbytes
+        return self
+
+    def copy(self):
+        other = HMAC.__new__(HMAC)
+        other.__dict__.update(self.__dict__)
+        other._inner = self._inner.copy()
+        return other
+
+    def digest(self):
+        start = time.perf_counter()
+        outer = self._outer.copy()
+        outer.update(self._inner.digest())
+        output = outer.digest()
+
+        if metrics.ENABLED and not self._recorded:
+            self._recorded = True
+            elapsed        = self._elapsed + time.perf_counter() - start
+            metrics.add('crydi_hmac_total', algorithm=self.name)
+            metrics.record(self.name, 'hmac', self._size, elapsed)
+            metrics.observe('crydi_hmac_latency_seconds', elapsed, algorithm=self.name)
+        return output
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+def new(key, hash_fn, hex_key=True, encoding='utf-8', backend='auto'):
+    return HMAC(key, hash_fn, hex_key, encoding, backend)
+# =================================================================================
+
+def digest(input_data, hash_fn, key, hex_input=False, hex_key=True, encoding='utf-8',
+           backend='auto'):
     if not key:
         raise RuntimeError('Not given key!')
 
+    if backend == 'auto' or backends.get(hash_fn, backend).new is not None:
+        streaming = HMAC(key, hash_fn, hex_key, encoding, backend)
+        return streaming.update(input_data, hex_input).hexdigest()
+
+    start = time.perf_counter()
+
+    # Backends that can't hash incrementally (the reference implementation)
+    name       = hash_fn
     hash_fn    = HASH_FN[hash_fn]
     block_size = hash_fn.BLOCK_SIZE
 
-    key = common.fromhex(key) if hex_key else common.encode(key, encoding)
+    key = list(common.to_bytes(key, hex_key, encoding))
     if len(key) > block_size:
         key = ''.join(f'{byte:02x}' for byte in key)
-        key = hash_fn.digest(key, hex_input=True, encoding=encoding)
-        key = common.fromhex(key)
+        key = backends.digest(key, name, hex_input=True, encoding=encoding, backend=backend)
+        key = list(bytes.fromhex(key))
 
     while len(key) != block_size:
         key.append(0x00)
@@ -33,17 +119,18 @@ def digest(input_data, hash_fn, key, hex_input=False, hex_key=True, encoding='ut
     kipad = [k ^ ipad for k in key]
     kopad = [k ^ opad for k in key]
 
-    if not hex_input:
-        input_data = common.encode(input_data, encoding=encoding)
-    else:
-        input_data = common.fromhex(input_data)
+    input_data = list(common.to_bytes(input_data, hex_input, encoding))
 
     data   = ''.join(f'{byte:02x}' for byte in (kipad + input_data))
-    output = hash_fn.digest(data, hex_input=True)
+    output = backends.digest(data, name, hex_input=True, backend=backend)
 
     data   = ''.join(f'{byte:02x}' for byte in kopad) + output
-    output = hash_fn.digest(data, hex_input=True)
+    output = backends.digest(data, name, hex_input=True, backend=backend)
 
+    if metrics.ENABLED:
+        metrics.add('crydi_hmac_total', algorithm=name)
+        metrics.observe('crydi_hmac_latency_seconds', time.perf_counter() - start,
+                        algorithm=name)
     return output
 
 if __name__ == '__main__':
@@ -52,5 +139,17 @@ if __name__ == '__main__':
     assert(digest('54657374205573696e67204c6172676572205468616e20426c6f636b2d53697a65204b6579202d2048617368204b6579204669727374',
                   'SHA-256', 'aa' * 131, hex_input=True)
            == '60e431591ee0b67f0d8a26aacbf5b77f8e0bc6213728c5140546040f0ee37f54')
+    assert(digest('Hi There', 'MD5', '0b0b0b0b0b0b0b0b0b0b0b0b0b0b0b0b', backend='reference')
+           == '9294727a3638bb1c13f48ef8158bfc9d')
+    assert(digest(b'Hi There', 'MD5', b'\x0b' * 16, hex_key=False, backend='reference')
+           == digest(b'Hi There', 'MD5', b'\x0b' * 16, hex_key=False)
+           == '9294727a3638bb1c13f48ef8158bfc9d')
+    assert(digest(b'abc', 'MD5', b'0b0b', backend='reference')
+           == digest(b'abc', 'MD5', b'0b0b'))
+
+    hmac = HMAC('aa' * 131, 'SHA-256')
+    for chunk in ['Test Using Larger Than ', 'Block-Size Key - ', 'Hash Key First']:
+        hmac.update(chunk)
+    assert(hmac.hexdigest() == '60e431591ee0b67f0d8a26aacbf5b77f8e0bc6213728c5140546040f0ee37f54')
 
     print('OK!')
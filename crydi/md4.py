@@ -6,14 +6,14 @@ import crydi.common as common
 # =================================================================================
 BLOCK_SIZE = 64
 
-S = np.array([[3, 7, 11, 19], [3, 5, 9, 13], [3, 9, 11, 15]]) 
+S = ((3, 7, 11, 19), (3, 5, 9, 13), (3, 9, 11, 15))
 
-THIRD_ROUND = np.array([
+THIRD_ROUND = (
     0,  8, 4, 12,
     2, 10, 6, 14,
     1,  9, 5, 13, 
     3, 11, 7, 15,
-])
+)
 
 # =================================================================================
 # Auxiliar functions
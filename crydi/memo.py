@@ -0,0 +1,146 @@
+import os
+import hashlib
+import threading
+import collections
+import crydi.hmac as hmac
+import crydi.stream as stream
+import crydi.metrics as metrics
+import crydi.backends as backends
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+MAX_ENTRIES = 1024
+# =================================================================================
+
+# =================================================================================
+# Bounded LRU cache of digests
+# =================================================================================
+class DigestCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits        = 0
+        self.misses      = 0
+
+        self._entries = collections.OrderedDict()
+        self._lock    = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                if metrics.ENABLED:
+                    metrics.add('crydi_cache_requests_total', result='hit')
+                return self._entries[key]
+
+        # Computed without the lock, two threads may compute the same entry
+        value = compute()
+
+        if metrics.ENABLED:
+            metrics.add('crydi_cache_requests_total', result='miss')
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return value
+
+CACHE = DigestCache()
+# =================================================================================
+
+# =================================================================================
+# Fingerprint of a content (text or bytes-like). Callers hashing the same
+# content with several algorithms compute it once and pass it as content_key
+# =================================================================================
+def fingerprint(content):
+    if isinstance(content, str):
+        data = content.encode('utf-8', 'surrogatepass')
+    else:
+        data = memoryview(content).cast('B')
+
+    return (type(content).__name__, len(data), hashlib.blake2b(data, digest_size=32).digest())
+# =================================================================================
+
+# =================================================================================
+# Memoized versions of backends.digest and hmac.digest
+# =================================================================================
+def digest(input_data, hash_fn, hex_input=False, encoding='utf-8', backend='auto',
+           cache=CACHE, content_key=None):
+    content_key = content_key or fingerprint(input_data)
+    key         = (content_key, hash_fn, hex_input, encoding, None, None)
+    return cache.get(key, lambda: backends.digest(input_data, hash_fn, hex_input, encoding,
+                                                  backend))
+
+def hmac_digest(input_data, hash_fn, key, hex_input=False, hex_key=True, encoding='utf-8',
+                backend='auto', cache=CACHE, content_key=None):
+    # The key itself is not kept in the cache, only its fingerprint
+    content_key = content_key or fingerprint(input_data)
+    entry       = (content_key, hash_fn, hex_input, encoding, fingerprint(key), hex_key)
+    return cache.get(entry, lambda: hmac.digest(input_data, hash_fn, key, hex_input, hex_key,
+                                                encoding, backend))
+# =================================================================================
+
+# =================================================================================
+# Memoized digests of files, read in chunks and keyed by path, size and
+# modification time (a file changed on disk is hashed again)
+# =================================================================================
+def file_key(path):
+    info = os.stat(path)
+    return ('file', os.path.realpath(path), info.st_size, info.st_mtime_ns)
+
+def file_digest(path, hash_fn, hex_input=False, backend='auto', cache=CACHE):
+    key = (file_key(path), hash_fn, hex_input, None, None, None)
+    return cache.get(key, lambda: stream.digest_file(path, hash_fn, hex_input, backend=backend))
+
+def file_hmac_digest(path, hash_fn, key, hex_input=False, hex_key=True, backend='auto',
+                     cache=CACHE):
+    entry = (file_key(path), hash_fn, hex_input, None, fingerprint(key), hex_key)
+    return cache.get(entry, lambda: stream.hmac_file(path, hash_fn, key, hex_input, hex_key,
+                                                     backend=backend))
+# =================================================================================
+
+if __name__ == '__main__':
+    cache = DigestCache(max_entries=2)
+
+    assert(digest('abc', 'MD5', cache=cache) == '900150983cd24fb0d6963f7d28e17f72')
+    assert(digest('abc', 'MD5', cache=cache) == '900150983cd24fb0d6963f7d28e17f72')
+    assert(digest('616263', 'MD5', hex_input=True, cache=cache)
+           == '900150983cd24fb0d6963f7d28e17f72')
+    assert((cache.hits, cache.misses) == (1, 2))
+
+    assert(hmac_digest('Hi There', 'MD5', '0b' * 16, cache=cache)
+           == '9294727a3638bb1c13f48ef8158bfc9d')
+    assert(len(cache) == 2)
+
+    # Mutable inputs are fingerprinted again every time
+    data = bytearray(b'abc')
+    assert(digest(data, 'MD5', cache=cache) == '900150983cd24fb0d6963f7d28e17f72')
+    data[0] = ord('x')
+    assert(digest(data, 'MD5', cache=cache) == 'c9efacca293ef80d861dd2796de1acb7')
+
+    assert(hmac_digest('Hi There', 'MD5', b'\x0b' * 16, hex_key=False, cache=cache)
+           == '9294727a3638bb1c13f48ef8158bfc9d')
+    import tempfile
+    with tempfile.NamedTemporaryFile() as file:
+        file.write(b'abc')
+        file.flush()
+        assert(file_digest(file.name, 'MD5', cache=cache) == '900150983cd24fb0d6963f7d28e17f72')
+        assert(file_hmac_digest(file.name, 'MD5', '0b' * 16, cache=cache)
+               == 'af41184ad30d425a753e60f7d8be4220')
+
+        misses = cache.misses
+        assert(file_digest(file.name, 'MD5', cache=cache) == '900150983cd24fb0d6963f7d28e17f72')
+        assert(cache.misses == misses)
+
+    print('OK!')
@@ -0,0 +1,230 @@
+import os
+import bisect
+import threading
+import http.server
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+# Nothing is recorded unless enabled (here or with enable)
+ENABLED = os.environ.get('CRYDI_METRICS', '') not in ('', '0')
+
+DEFAULT_PORT = 9464
+
+LATENCY_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+SIZE_BUCKETS    = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+HELP = {
+    'crydi_bytes_total': ('counter', 'Bytes hashed'),
+    'crydi_messages_total': ('counter', 'Messages hashed'),
+    'crydi_latency_seconds': ('histogram', 'Time of every digest, one-shot or incremental'),
+    'crydi_batch_size': ('histogram', 'Messages of every digest_many call'),
+    'crydi_hmac_total': ('counter', 'HMAC computations'),
+    'crydi_hmac_latency_seconds': ('histogram', 'Time of every HMAC'),
+    'crydi_cache_requests_total': ('counter', 'Lookups in the digest cache, by result'),
+    'crydi_server_batch_size': ('histogram', 'Requests coalesced by the server batcher'),
+    'crydi_server_latency_seconds': ('histogram', 'Time to serve a request, by operation'),
+}
+# =================================================================================
+
+# =================================================================================
+# Every thread writes to its own shard, so recording takes no lock. Shards of
+# finished threads are folded into one when a snapshot is taken
+# =================================================================================
+class Shard:
+    def __init__(self, thread=None):
+        self.thread     = thread
+        self.counters   = {}
+        self.histograms = {}
+
+    def merge(self, other):
+        for key, value in dict(other.counters).items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+        for key, (buckets, counts, total) in dict(other.histograms).items():
+            entry = self.histograms.setdefault(key, [buckets, [0] * len(counts), 0])
+            entry[1] = [a + b for a, b in zip(entry[1], counts)]
+            entry[2] += total
+
+_local   = threading.local()
+_lock    = threading.Lock()
+_shards  = []
+_retired = Shard()
+
+def shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        current = _local.shard = Shard(threading.current_thread())
+        with _lock:
+            _shards.append(current)
+        return current
+
+def enable(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+
+def reset():
+    global _retired
+    with _lock:
+        for current in _shards:
+            current.counters.clear()
+            current.histograms.clear()
+        _retired = Shard()
+# =================================================================================
+
+# =================================================================================
+# Recording, labels are given as keyword arguments
+# =================================================================================
+def add(name, value=1, **labels):
+    counters = shard().counters
+    key      = (name, tuple(sorted(labels.items())))
+    counters[key] = counters.get(key, 0) + value
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    histograms = shard().histograms
+    key        = (name, tuple(sorted(labels.items())))
+
+    entry = histograms.get(key)
+    if entry is None:
+        entry = histograms[key] = [buckets, [0] * (len(buckets) + 1), 0]
+
+    entry[1][bisect.bisect_left(buckets, value)] += 1
+    entry[2] += value
+
+# One digest call of size bytes over messages messages that took elapsed seconds
+def record(algorithm, backend, size, elapsed, messages=1):
+    add('crydi_bytes_total', size, algorithm=algorithm, backend=backend)
+    add('crydi_messages_total', messages, algorithm=algorithm, backend=backend)
+    observe('crydi_latency_seconds', elapsed, algorithm=algorithm, backend=backend)
+# =================================================================================
+
+# =================================================================================
+# Reading: snapshot returns {name: {labels: value}}, where labels is a tuple of
+# (label, value) pairs and the value of a histogram is a dict with its
+# cumulative buckets (upper bound -> count), sum and count
+# =================================================================================
+def snapshot():
+    total = Shard()
+    with _lock:
+        for current in list(_shards):
+            if not current.thread.is_alive():
+                _retired.merge(current)
+                _shards.remove(current)
+        for current in _shards + [_retired]:
+            total.merge(current)
+
+    output = {}
+    for (name, labels), value in total.counters.items():
+        output.setdefault(name, {})[labels] = value
+
+    for (name, labels), (buckets, counts, value) in total.histograms.items():
+        cumulative, running = {}, 0
+        for bound, count in zip(buckets + (float('inf'),), counts):
+            running += count
+            cumulative[bound] = running
+        output.setdefault(name, {})[labels] = {
+            'buckets': cumulative, 'sum': value, 'count': running,
+        }
+
+    return output
+
+def hit_rate():
+    requests = snapshot().get('crydi_cache_requests_total', {})
+    hits     = requests.get((('result', 'hit'),), 0)
+    misses   = requests.get((('result', 'miss'),), 0)
+    return hits / (hits + misses) if hits + misses else 0.0
+# =================================================================================
+
+# =================================================================================
+# Prometheus text format, served by a local HTTP thread
+# =================================================================================
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels, extra=()):
+    pairs = [f'{label}="{escape(value)}"' for label, value in labels + tuple(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+def render():
+    lines = []
+    for name, series in sorted(snapshot().items()):
+        kind, description = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+
+        for labels, value in sorted(series.items()):
+            if not isinstance(value, dict):
+                lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+
+            for bound, count in value['buckets'].items():
+                le = format_labels(labels, [('le', format_bound(bound))])
+                lines.append(f'{name}_bucket{le} {count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {value["sum"]}')
+            lines.append(f'{name}_count{format_labels(labels)} {value["count"]}')
+
+    return '\n'.join(lines) + '\n'
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+# Starts recording and serves /metrics until shutdown() is called on the result
+def serve(port=DEFAULT_PORT, host='127.0.0.1'):
+    enable()
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+# =================================================================================
+
+if __name__ == '__main__':
+    import urllib.request
+
+    enable()
+    record('MD5', 'hashlib', 64, 2e-4)
+    record('MD5', 'hashlib', 128, 5e-3, messages=2)
+    add('crydi_cache_requests_total', result='hit')
+    add('crydi_cache_requests_total', result='miss')
+
+    worker = threading.Thread(target=add, args=('crydi_hmac_total',), kwargs={'algorithm': 'MD5'})
+    worker.start()
+    worker.join()
+
+    values = snapshot()
+    labels = (('algorithm', 'MD5'), ('backend', 'hashlib'))
+    assert(values['crydi_bytes_total'][labels] == 192)
+    assert(values['crydi_messages_total'][labels] == 3)
+    assert(values['crydi_latency_seconds'][labels]['buckets'][1e-3] == 1)
+    assert(values['crydi_latency_seconds'][labels]['count'] == 2)
+    assert(values['crydi_hmac_total'][(('algorithm', 'MD5'),)] == 1)
+    assert(hit_rate() == 0.5)
+
+    server = serve(port=0)
+    try:
+        url  = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        text = urllib.request.urlopen(url).read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert('crydi_bytes_total{algorithm="MD5",backend="hashlib"} 192' in text)
+    assert('crydi_latency_seconds_bucket{algorithm="MD5",backend="hashlib",le="+Inf"} 2' in text)
+    assert(format_labels((('op', 'a"b\\c\nd'),)) == '{op="a\\"b\\\\c\\nd"}')
+    print('OK!')
@@ -0,0 +1,122 @@
+import os
+import mmap
+import concurrent.futures
+from multiprocessing import shared_memory
+import crydi.stream as stream
+import crydi.backends as backends
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+DEFAULT_ALGORITHMS = ('MD5', 'SHA-1', 'SHA-256')
+# =================================================================================
+
+# =================================================================================
+# Workers, every one maps the same pages (file or shared memory) and runs one
+# algorithm over them, so the input is never copied per algorithm. Run in a
+# single process, every chunk goes through all the algorithms in one pass
+# =================================================================================
+def hash_view_all(view, hash_fns, backend, chunk_size):
+    hashers = [backends.new(hash_fn, backend=backend) for hash_fn in hash_fns]
+    for start in range(0, len(view), chunk_size):
+        chunk = view[start:start + chunk_size]
+        for hasher in hashers:
+            hasher.update(chunk)
+    return {hash_fn: hasher.hexdigest() for hash_fn, hasher in zip(hash_fns, hashers)}
+
+def hash_view(view, hash_fn, backend, chunk_size):
+    return hash_view_all(view, [hash_fn], backend, chunk_size)[hash_fn]
+
+def digest_path_all(path, hash_fns, backend='auto', chunk_size=stream.CHUNK_SIZE):
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return hash_view_all(b'', hash_fns, backend, chunk_size)
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                return hash_view_all(view, hash_fns, backend, chunk_size)
+            finally:
+                view.release()
+
+def digest_path(path, hash_fn, backend='auto', chunk_size=stream.CHUNK_SIZE):
+    return digest_path_all(path, [hash_fn], backend, chunk_size)[hash_fn]
+
+def digest_shared(name, size, hash_fn, backend='auto', chunk_size=stream.CHUNK_SIZE):
+    shm  = shared_memory.SharedMemory(name=name)
+    view = shm.buf[:size]
+    try:
+        return hash_view(view, hash_fn, backend, chunk_size)
+    finally:
+        view.release()
+        shm.close()
+# =================================================================================
+
+# =================================================================================
+# Digest one input with several algorithms at the same time, one process per
+# algorithm. source is a path or a bytes-like object (copied once into shared
+# memory). Returns a dict algorithm -> digest
+# =================================================================================
+def digest_all(source, hash_fns=DEFAULT_ALGORITHMS, jobs=None, backend='auto',
+               chunk_size=stream.CHUNK_SIZE):
+    for hash_fn in hash_fns:
+        if hash_fn not in backends.REGISTRY:
+            raise RuntimeError(f'Unknown algorithm ({hash_fn})')
+
+    jobs = min(jobs or os.cpu_count() or 1, len(hash_fns))
+    path = isinstance(source, (str, os.PathLike))
+
+    if jobs <= 1:
+        if path:
+            return digest_path_all(source, list(hash_fns), backend, chunk_size)
+        return hash_view_all(memoryview(source).cast('B'), list(hash_fns), backend, chunk_size)
+
+    shm = None
+    if not path:
+        data = memoryview(source).cast('B')
+        shm  = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[:len(data)] = data
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            if path:
+                futures = {
+                    hash_fn: executor.submit(digest_path, source, hash_fn, backend, chunk_size)
+                    for hash_fn in hash_fns
+                }
+            else:
+                futures = {
+                    hash_fn: executor.submit(digest_shared, shm.name, len(data), hash_fn, backend,
+                                             chunk_size)
+                    for hash_fn in hash_fns
+                }
+
+            return {hash_fn: future.result() for hash_fn, future in futures.items()}
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+# =================================================================================
+
+if __name__ == '__main__':
+    import hashlib
+    import tempfile
+
+    data     = bytes(range(256)) * 4000
+    expected = {
+        'MD5': hashlib.md5(data).hexdigest(),
+        'SHA-1': hashlib.sha1(data).hexdigest(),
+        'SHA-256': hashlib.sha256(data).hexdigest(),
+    }
+
+    assert(digest_all(data, jobs=3) == expected)
+    assert(digest_all(data, jobs=1) == expected)
+
+    with tempfile.NamedTemporaryFile() as file:
+        file.write(data)
+        file.flush()
+        assert(digest_all(file.name, jobs=3) == expected)
+        assert(digest_all(file.name, ['MD4'], jobs=3)
+               == {'MD4': backends.digest(data, 'MD4')})
+
+    print('OK!')
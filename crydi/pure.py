@@ -0,0 +1,323 @@
+import os
+import sys
+import struct
+import marshal
+import hashlib
+import crydi.md5 as md5
+import crydi.sha256 as sha256
+import crydi.common as common
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+MASK = 0xffffffff
+
+MD4_INIT    = (0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476)
+MD5_INIT    = (0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476)
+SHA1_INIT   = (0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476, 0xc3d2e1f0)
+SHA256_INIT = (
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a,
+    0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+)
+
+MD4_S  = ((3, 7, 11, 19), (3, 5, 9, 13), (3, 9, 11, 15))
+MD4_G  = tuple(range(16)) + (0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15) \
+       + (0, 8, 4, 12, 2, 10, 6, 14, 1, 9, 5, 13, 3, 11, 7, 15)
+
+MD5_S  = ((7, 12, 17, 22), (5, 9, 14, 20), (4, 11, 16, 23), (6, 10, 15, 21))
+MD5_G  = tuple(range(16)) \
+       + tuple((5 * j + 1) % 16 for j in range(16, 32)) \
+       + tuple((3 * j + 5) % 16 for j in range(32, 48)) \
+       + tuple((7 * j) % 16 for j in range(48, 64))
+MD5_T  = tuple(int(k) for k in md5.T)
+
+SHA1_K   = (0x5a827999, 0x6ed9eba1, 0x8f1bbcdc, 0xca62c1d6)
+SHA256_K = tuple(int(k) for k in sha256.K)
+# =================================================================================
+
+# =================================================================================
+# Code generation: the compression functions are unrolled, with the round
+# function, message word, shift and constant of every step written inline and
+# the chaining variables renamed instead of shifted. They take the state as a
+# tuple of ints and compress the blocks consecutive 64-byte blocks starting at
+# offset of a bytes-like buffer, keeping the state in locals between blocks
+# =================================================================================
+def rotl(x, n):
+    return f'(({x} << {n}) | ({x} >> {32 - n}))'
+
+def rotr(x, n):
+    return f'(({x} >> {n}) | ({x} << {32 - n}))'
+
+# Wraps the unrolled body of one block (that ends with the working variables
+# in names) in the loop over the blocks
+def compress_function(name, names, body):
+    chaining = ', '.join(f'h{i}' for i in range(len(names)))
+    lines    = [
+        f'def {name}(state, data, offset=0, blocks=1):',
+        f'    {chaining} = state',
+        '    for offset in range(offset, offset + 64 * blocks, 64):',
+        f'        {", ".join(names)} = {chaining}',
+    ]
+    lines += ['        ' + line for line in body]
+    lines += [f'        h{i} = (h{i} + {var}) & {MASK:#x}' for i, var in enumerate(names)]
+    lines.append(f'    return {chaining}')
+    return '\n'.join(lines) + '\n'
+
+def generate_md4():
+    names = ['a', 'b', 'c', 'd']
+    lines = [', '.join(f'x{i}' for i in range(16)) + " = unpack_from('<16I', data, offset)"]
+
+    rounds = [
+        ('(({b} & {c}) | (~{b} & {d}))', 0),
+        ('(({b} & {c}) | ({b} & {d}) | ({c} & {d}))', 0x5a827999),
+        ('({b} ^ {c} ^ {d})', 0x6ed9eba1),
+    ]
+    for j in range(48):
+        a, b, c, d = names[-j % 4], names[(1 - j) % 4], names[(2 - j) % 4], names[(3 - j) % 4]
+        function, constant = rounds[j // 16]
+        function = function.format(b=b, c=c, d=d)
+
+        lines.append(f'{a} = ({a} + {function} + x{MD4_G[j]} + {constant:#x}) & {MASK:#x}')
+        lines.append(f'{a} = {rotl(a, MD4_S[j // 16][j % 4])} & {MASK:#x}')
+
+    return compress_function('md4_compress', names, lines)
+
+def generate_md5():
+    names = ['a', 'b', 'c', 'd']
+    lines = [', '.join(f'x{i}' for i in range(16)) + " = unpack_from('<16I', data, offset)"]
+
+    rounds = [
+        '(({b} & {c}) | (~{b} & {d}))',
+        '(({b} & {d}) | ({c} & ~{d}))',
+        '({b} ^ {c} ^ {d})',
+        '({c} ^ ({b} | ~{d}))',
+    ]
+    for j in range(64):
+        a, b, c, d = names[-j % 4], names[(1 - j) % 4], names[(2 - j) % 4], names[(3 - j) % 4]
+        function = rounds[j // 16].format(b=b, c=c, d=d)
+
+        lines.append(f'{a} = ({a} + {function} + x{MD5_G[j]} + {MD5_T[j]:#x}) & {MASK:#x}')
+        lines.append(f'{a} = ({b} + ({rotl(a, MD5_S[j // 16][j % 4])} & {MASK:#x})) & {MASK:#x}')
+
+    return compress_function('md5_compress', names, lines)
+
+def generate_sha1():
+    names = ['a', 'b', 'c', 'd', 'e']
+    lines = [', '.join(f'w{i}' for i in range(16)) + " = unpack_from('>16I', data, offset)"]
+
+    for i in range(16, 80):
+        lines.append(f'w{i} = w{i - 3} ^ w{i - 8} ^ w{i - 14} ^ w{i - 16}')
+        lines.append(f'w{i} = {rotl(f"w{i}", 1)} & {MASK:#x}')
+
+    rounds = [
+        '(({b} & {c}) | (~{b} & {d}))',
+        '({b} ^ {c} ^ {d})',
+        '(({b} & {c}) | ({b} & {d}) | ({c} & {d}))',
+        '({b} ^ {c} ^ {d})',
+    ]
+    for j in range(80):
+        a, b, c, d, e = (names[(k - j) % 5] for k in range(5))
+        function = rounds[j // 20].format(b=b, c=c, d=d)
+
+        lines.append(f'{e} = ({rotl(a, 5)} + {function} + {e} + {SHA1_K[j // 20]:#x} + w{j}) '
+                     f'& {MASK:#x}')
+        lines.append(f'{b} = {rotl(b, 30)} & {MASK:#x}')
+
+    return compress_function('sha1_compress', names, lines)
+
+def generate_sha256():
+    names = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+    lines = [', '.join(f'w{i}' for i in range(16)) + " = unpack_from('>16I', data, offset)"]
+
+    for i in range(16, 64):
+        x, y = f'w{i - 15}', f'w{i - 2}'
+        lines.append(f's0 = {rotr(x, 7)} ^ {rotr(x, 18)} ^ ({x} >> 3)')
+        lines.append(f's1 = {rotr(y, 17)} ^ {rotr(y, 19)} ^ ({y} >> 10)')
+        lines.append(f'w{i} = (w{i - 16} + s0 + w{i - 7} + s1) & {MASK:#x}')
+
+    for j in range(64):
+        a, b, c, d, e, f, g, h = (names[(k - j) % 8] for k in range(8))
+
+        lines.append(f't1 = ({h} + (({rotr(e, 6)} ^ {rotr(e, 11)} ^ {rotr(e, 25)}) & {MASK:#x}) '
+                     f'+ (({e} & {f}) ^ (~{e} & {g})) + {SHA256_K[j]:#x} + w{j}) & {MASK:#x}')
+        lines.append(f't2 = (({rotr(a, 2)} ^ {rotr(a, 13)} ^ {rotr(a, 22)}) & {MASK:#x}) '
+                     f'+ (({a} & {b}) ^ ({a} & {c}) ^ ({b} & {c}))')
+        lines.append(f'{d} = ({d} + t1) & {MASK:#x}')
+        lines.append(f'{h} = (t1 + t2) & {MASK:#x}')
+
+    return compress_function('sha256_compress', names, lines)
+# =================================================================================
+
+# =================================================================================
+# Compile the generated functions, the code objects are cached on disk (next to
+# the bytecode of the package) so later imports only unmarshal them
+# =================================================================================
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+
+def compile_generated(name, generator):
+    source = generator()
+    key    = hashlib.sha1(source.encode('ascii')).hexdigest()[:16]
+    path   = os.path.join(CACHE_DIR, f'crydi_{name}.{sys.implementation.cache_tag}.{key}.bin')
+
+    try:
+        with open(path, 'rb') as file:
+            code = marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        code = compile(source, f'<crydi generated {name}>', 'exec')
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            temporary = f'{path}.{os.getpid()}'
+            with open(temporary, 'wb') as file:
+                marshal.dump(code, file)
+            os.replace(temporary, path)
+
+            # Code generated by older versions of the generators
+            prefix = f'crydi_{name}.{sys.implementation.cache_tag}.'
+            for stale in os.listdir(CACHE_DIR):
+                stale = os.path.join(CACHE_DIR, stale)
+                if os.path.basename(stale).startswith(prefix) and stale != path:
+                    os.unlink(stale)
+        except OSError:
+            pass
+
+    namespace = {'unpack_from': struct.unpack_from}
+    exec(code, namespace)
+    return namespace[name]
+
+md4_compress    = compile_generated('md4_compress', generate_md4)
+md5_compress    = compile_generated('md5_compress', generate_md5)
+sha1_compress   = compile_generated('sha1_compress', generate_sha1)
+sha256_compress = compile_generated('sha256_compress', generate_sha256)
+# =================================================================================
+
+# =================================================================================
+# Description of every algorithm: initial state, compression and byte order
+# =================================================================================
+class Algorithm:
+    def __init__(self, name, initial, compress, byte_format, block_size=64):
+        self.name        = name
+        self.initial     = initial
+        self.compress    = compress
+        self.byte_format = byte_format
+        self.block_size  = block_size
+        self.digest_size = 4 * len(initial)
+
+        endian           = '<' if byte_format == common.ByteFormat.LittleEndian else '>'
+        self.state_fmt   = f'{endian}{len(initial)}I'
+        self.length_fmt  = f'{endian}Q'
+
+ALGORITHMS = {
+    'MD4':     Algorithm('MD4', MD4_INIT, md4_compress, common.ByteFormat.LittleEndian),
+    'MD5':     Algorithm('MD5', MD5_INIT, md5_compress, common.ByteFormat.LittleEndian),
+    'SHA-1':   Algorithm('SHA-1', SHA1_INIT, sha1_compress, common.ByteFormat.BigEndian),
+    'SHA-256': Algorithm('SHA-256', SHA256_INIT, sha256_compress, common.ByteFormat.BigEndian),
+}
+# =================================================================================
+
+# =================================================================================
+# Bytes appended to a message of length bytes (0x80, zeros and the bit length)
+# =================================================================================
+def padding(algorithm, length):
+    fill = (55 - length) % algorithm.block_size
+    return b'\x80' + b'\x00' * fill + struct.pack(algorithm.length_fmt, (8 * length) & (2**64 - 1))
+# =================================================================================
+
+# =================================================================================
+# Incremental hash object, with the same interface of the hashlib ones
+# =================================================================================
+class Hash:
+    def __init__(self, algorithm, data=b''):
+        if algorithm not in ALGORITHMS:
+            raise RuntimeError(f'Unknown algorithm ({algorithm})')
+
+        self.algorithm   = ALGORITHMS[algorithm]
+        self.name        = algorithm
+        self.block_size  = self.algorithm.block_size
+        self.digest_size = self.algorithm.digest_size
+
+        # Bytes of an unfinished block, kept in a fixed buffer (_filled of them)
+        self._state  = self.algorithm.initial
+        self._buffer = bytearray(self.block_size)
+        self._filled = 0
+        self._length = 0
+
+        if data:
+            self.update(data)
+
+    def update(self, data):
+        data = memoryview(data).cast('B')
+        self._length += len(data)
+
+        block_size = self.block_size
+        compress   = self.algorithm.compress
+        state      = self._state
+        filled     = self._filled
+
+        if filled:
+            taken = min(block_size - filled, len(data))
+            self._buffer[filled:filled + taken] = data[:taken]
+            data    = data[taken:]
+            filled += taken
+            if filled < block_size:
+                self._filled = filled
+                return
+
+            state = compress(state, self._buffer)
+
+        # Every whole block of data in a single call
+        blocks = len(data) // block_size
+        if blocks:
+            state = compress(state, data, 0, blocks)
+
+        end          = blocks * block_size
+        self._filled = len(data) - end
+        self._buffer[:self._filled] = data[end:]
+        self._state  = state
+
+    def copy(self):
+        other = Hash.__new__(Hash)
+        other.__dict__.update(self.__dict__)
+        other._buffer = bytearray(self._buffer)
+        return other
+
+    def digest(self):
+        tail  = self._buffer[:self._filled] + padding(self.algorithm, self._length)
+        state = self.algorithm.compress(self._state, tail, 0, len(tail) // self.block_size)
+        return struct.pack(self.algorithm.state_fmt, *state)
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+def new(algorithm, data=b''):
+    return Hash(algorithm, data)
+# =================================================================================
+
+# =================================================================================
+# Same interface as the digest function of every algorithm module
+# =================================================================================
+def digest(input_data, hash_fn, hex_input=False, encoding='utf-8'):
+    return Hash(hash_fn, common.to_bytes(input_data, hex_input, encoding)).hexdigest()
+# =================================================================================
+
+if __name__ == '__main__':
+    assert(digest('abc', 'MD4') == 'a448017aaf21d8525fc10ae87aa6729d')
+    assert(digest('abc', 'MD5') == '900150983cd24fb0d6963f7d28e17f72')
+    assert(digest('abc', 'SHA-1') == 'a9993e364706816aba3e25717850c26c9cd0d89d')
+    assert(digest('abc', 'SHA-256')
+           == 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad')
+    assert(digest('ó', 'MD5') == '5ab838a6f466a5fe1ddbc08340cc21f1')
+
+    # One call over several blocks, or one per block
+    data  = bytes(range(256))
+    state = MD5_INIT
+    for offset in range(0, len(data), 64):
+        state = md5_compress(state, data, offset)
+    assert(md5_compress(MD5_INIT, data, 0, 4) == state)
+
+    hasher = new('SHA-256', b'a' * 100)
+    hasher.update(b'b' * 30)
+    other  = hasher.copy()
+    other.update(b'c')
+    assert(hasher.hexdigest() == hashlib.sha256(b'a' * 100 + b'b' * 30).hexdigest())
+    assert(other.hexdigest() == hashlib.sha256(b'a' * 100 + b'b' * 30 + b'c').hexdigest())
+    print('OK!')
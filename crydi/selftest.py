@@ -0,0 +1,312 @@
+import sys
+import time
+import random
+import hashlib
+import argparse
+import hmac as std_hmac
+import crydi.hmac as hmac
+import crydi.pure as pure
+import crydi.stream as stream
+import crydi.backends as backends
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+KNOWN_ANSWERS = {
+    'MD4': [
+        ('', '31d6cfe0d16ae931b73c59d7e0c089c0'),
+        ('a', 'bde52cb31de33e46245e05fbdbd6fb24'),
+        ('abc', 'a448017aaf21d8525fc10ae87aa6729d'),
+        ('message digest', 'd9130a8164549fe818874806e1c7014b'),
+        ('abcdefghijklmnopqrstuvwxyz', 'd79e1c308aa5bbcdeea8ed63df412da9'),
+        ('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789',
+         '043f8582f241db351ce627e153e7f0e4'),
+        ('1234567890' * 8, 'e33b4ddc9c38f2199c3e7b164fcc0536'),
+    ],
+    'MD5': [
+        ('', 'd41d8cd98f00b204e9800998ecf8427e'),
+        ('a', '0cc175b9c0f1b6a831c399e269772661'),
+        ('abc', '900150983cd24fb0d6963f7d28e17f72'),
+        ('message digest', 'f96b697d7cb7938d525a2f31aaf161d0'),
+        ('abcdefghijklmnopqrstuvwxyz', 'c3fcd3d76192e4007dfb496cca67e13b'),
+        ('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789',
+         'd174ab98d277d9f5a5611c2c9f419d9f'),
+        ('1234567890' * 8, '57edf4a22be3c955ac49da2e2107b67a'),
+        ('ó', '5ab838a6f466a5fe1ddbc08340cc21f1'),
+    ],
+    'SHA-1': [
+        ('', 'da39a3ee5e6b4b0d3255bfef95601890afd80709'),
+        ('abc', 'a9993e364706816aba3e25717850c26c9cd0d89d'),
+        ('abcdbcdecdefdefgefghfghighijhijkijkljklmklmnlmnomnopnopq',
+         '84983e441c3bd26ebaae4aa1f95129e5e54670f1'),
+        ('abcdefghbcdefghicdefghijdefghijkefghijklfghijklmghijklmnhijklmno'
+         'ijklmnopjklmnopqklmnopqrlmnopqrsmnopqrstnopqrstu',
+         'a49b2446a02c645bf419f995b67091253a04a259'),
+        ('ó', 'a6abd767c025f163792b3f6d1fec94a731abce06'),
+    ],
+    'SHA-256': [
+        ('', 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'),
+        ('abc', 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad'),
+        ('abcdbcdecdefdefgefghfghighijhijkijkljklmklmnlmnomnopnopq',
+         '248d6a61d20638b8e5c026930c3e6039a33ce45964ff2167f6ecedd419db06c1'),
+        ('abcdefghbcdefghicdefghijdefghijkefghijklfghijklmghijklmnhijklmno'
+         'ijklmnopjklmnopqklmnopqrlmnopqrsmnopqrstnopqrstu',
+         'cf5b16a778af8380036ce59e7b0492370b249b11e8f07a51afac45037afee9d1'),
+        ('ó', 'aa2f86f8e3c3e2237b6c42bcb824f41402eed1c9b9a16bb80576c2002c4c01e3'),
+    ],
+}
+
+# (message, algorithm, key, hex_input, expected) from RFC 2104 and RFC 4231
+HMAC_ANSWERS = [
+    ('Hi There', 'MD4', '0b' * 16, False, '90a79458f58f437e21f169cdba283da6'),
+    ('Test Using Larger Than Block-Size Key - Hash Key First', 'MD4', 'aa' * 80, False,
+     '545b8f2577657042df628fbb98430d5f'),
+    ('Hi There', 'MD5', '0b' * 16, False, '9294727a3638bb1c13f48ef8158bfc9d'),
+    ('dd' * 50, 'MD5', 'aa' * 16, True, '56be34521d144c88dbb8c733f0e8b3f6'),
+    ('Hi There', 'SHA-256', '0b' * 20, False,
+     'b0344c61d8db38535ca8afceaf0bf12b881dc200c9833da726e9376c2e32cff7'),
+    ('54657374205573696e67204c6172676572205468616e20426c6f636b2d53697a65204b6579202d20'
+     '48617368204b6579204669727374', 'SHA-256', 'aa' * 131, True,
+     '60e431591ee0b67f0d8a26aacbf5b77f8e0bc6213728c5140546040f0ee37f54'),
+]
+
+# Lengths around the padding edges: the 0x80 byte and the 8-byte length fit
+# in the last block up to 55 bytes, from 56 on they need an extra block
+BOUNDARY_LENGTHS = sorted({
+    n + delta for n in (0, 55, 56, 64, 119, 120, 128) for delta in (-1, 0, 1) if n + delta >= 0
+})
+
+CHUNK_SIZES = (1, 3, 55, 56, 63, 64, 65, 127, 1000)
+
+# The reference implementation is slow, it only takes messages up to this size
+REFERENCE_LIMIT = 300
+# =================================================================================
+
+# =================================================================================
+# Auxiliar functions
+# =================================================================================
+def check(actual, expected, what):
+    if actual != expected:
+        raise AssertionError(f'{what}: got {actual}, expected {expected}')
+
+def oracle(algorithm, data):
+    try:
+        return hashlib.new(backends.HASHLIB_NAME[algorithm], data).hexdigest()
+    except ValueError:
+        return backends.REFERENCE[algorithm].digest(data)
+
+def input_types(data):
+    yield 'bytes', data, False
+    yield 'bytearray', bytearray(data), False
+    yield 'memoryview', memoryview(data), False
+    yield 'hex', data.hex(), True
+    yield 'HEX', data.hex().upper(), True
+
+    try:
+        yield 'str', data.decode('utf-8'), False
+    except UnicodeDecodeError:
+        pass
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+# =================================================================================
+
+# =================================================================================
+# Every backend against the published vectors
+# =================================================================================
+def known_answers():
+    for algorithm, answers in KNOWN_ANSWERS.items():
+        for name in backends.available(algorithm):
+            backend = backends.get(algorithm, name)
+            for message, expected in answers:
+                check(backend.digest(message), expected, f'{algorithm}/{name} {message!r}')
+
+            check(backend.digest_many([message for message, _ in answers]),
+                  [expected for _, expected in answers], f'{algorithm}/{name} many')
+
+    for message, algorithm, key, hex_input, expected in HMAC_ANSWERS:
+        for name in backends.available(algorithm):
+            check(hmac.digest(message, algorithm, key, hex_input, backend=name), expected,
+                  f'HMAC-{algorithm}/{name} {message!r}')
+# =================================================================================
+
+# =================================================================================
+# Every backend, input type and chunking against the oracle on a message
+# =================================================================================
+def differential(algorithm, data):
+    expected = oracle(algorithm, data)
+
+    for name in backends.available(algorithm):
+        if name == 'reference' and len(data) > REFERENCE_LIMIT:
+            continue
+
+        backend = backends.get(algorithm, name)
+        for kind, value, hex_input in input_types(data):
+            check(backend.digest(value, hex_input), expected,
+                  f'{algorithm}/{name} {kind} of {len(data)} bytes')
+
+        if backend.new is None:
+            continue
+
+        for size in CHUNK_SIZES:
+            hasher = backend.new()
+            for chunk in chunked(data, size):
+                hasher.update(chunk)
+
+            check(hasher.hexdigest(), expected,
+                  f'{algorithm}/{name} chunks of {size} over {len(data)} bytes')
+
+    check(backends.digest(data, algorithm), expected, f'{algorithm}/auto {len(data)} bytes')
+
+def hmac_oracle(algorithm, data, key):
+    try:
+        return std_hmac.new(key, data, backends.HASHLIB_NAME[algorithm]).hexdigest()
+    except ValueError:
+        return hmac.digest(data.hex(), algorithm, key.hex(), hex_input=True, backend='reference')
+
+def differential_hmac(algorithm, data, key):
+    expected = hmac_oracle(algorithm, data, key)
+
+    for name in backends.available(algorithm):
+        if name == 'reference' and len(data) + len(key) > REFERENCE_LIMIT:
+            continue
+
+        check(hmac.digest(data.hex(), algorithm, key.hex(), hex_input=True, backend=name),
+              expected, f'HMAC-{algorithm}/{name} key of {len(key)} bytes')
+
+        if backends.get(algorithm, name).new is None:
+            continue
+
+        for size in CHUNK_SIZES:
+            streaming = hmac.HMAC(key, algorithm, hex_key=False, backend=name)
+            for chunk in chunked(data, size):
+                streaming.update(chunk)
+
+            check(streaming.hexdigest(), expected,
+                  f'HMAC-{algorithm}/{name} chunks of {size}, key of {len(key)} bytes')
+
+def boundaries():
+    for algorithm in backends.ALGORITHMS:
+        for length in BOUNDARY_LENGTHS:
+            differential(algorithm, bytes(i % 251 for i in range(length)))
+
+        for length in (1, 63, 64, 65, 200):
+            differential_hmac(algorithm, b'm' * 100, bytes(i % 256 for i in range(length)))
+
+def streams():
+    data = bytes(i % 251 for i in range(1000))
+    text = ' '.join(data.hex()[i:i + 7] for i in range(0, 2000, 7))
+
+    for algorithm in backends.ALGORITHMS:
+        expected = oracle(algorithm, data)
+        for size in (1, 3, 64, 513):
+            check(stream.digest_chunks(chunked(text, size), algorithm, hex_input=True), expected,
+                  f'{algorithm} hex stream in chunks of {size}')
+
+    words = 'Ciencia de la Computación, ñandú, 漢字 ' * 20
+    for encoding in ('utf-8', 'latin-1', 'utf-16-le', 'utf-16-be', 'utf-16', 'utf-8-sig'):
+        data = words.encode(encoding, 'replace')
+        text = data.decode(encoding)
+        for size in (1, 7, 100):
+            check(stream.digest_text(text, 'MD5', encoding, chunk_size=size), oracle('MD5', data),
+                  f'{encoding} text in chunks of {size}')
+
+def fuzz(iterations=50, seed=0):
+    generator = random.Random(seed)
+
+    for _ in range(iterations):
+        algorithm = generator.choice(backends.ALGORITHMS)
+        length    = generator.choice([generator.randrange(130), generator.randrange(4096)])
+        data      = bytes(generator.getrandbits(8) for _ in range(length))
+        differential(algorithm, data)
+
+        key = bytes(generator.getrandbits(8) for _ in range(generator.randrange(1, 150)))
+        differential_hmac(algorithm, data[:200], key)
+# =================================================================================
+
+# =================================================================================
+# Throughput of every backend, in MB/s
+# =================================================================================
+def throughput(size=1 << 16, seconds=0.2):
+    data   = bytes(range(256)) * (size // 256)
+    report = {}
+
+    for algorithm in backends.ALGORITHMS:
+        for name in backends.available(algorithm):
+            backend = backends.get(algorithm, name)
+
+            # Slow backends are measured over a shorter sample, so every one
+            # of them takes about the same time
+            sample = data[:1024]
+            while len(sample) < len(data):
+                start = time.perf_counter()
+                backend.digest(sample)
+                if time.perf_counter() - start > seconds / 20:
+                    break
+                sample = data[:2 * len(sample)]
+
+            count = 0
+            start   = time.perf_counter()
+            while True:
+                backend.digest(sample)
+                count  += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= seconds:
+                    break
+
+            report[(algorithm, name)] = count * len(sample) / elapsed / 1e6
+
+    return report
+
+# Microseconds per block of the python backend, compressing blocks one call at
+# a time and all of them in a single call (the difference is the dispatch cost)
+def block_overhead(blocks=256, repeat=3):
+    data   = bytes(range(256)) * (blocks // 4)
+    report = {}
+
+    for algorithm in backends.ALGORITHMS:
+        description = pure.ALGORITHMS[algorithm]
+        compress    = description.compress
+        timings     = []
+
+        for batched in (False, True):
+            best = float('inf')
+            for _ in range(repeat):
+                state = description.initial
+                start = time.perf_counter()
+                if batched:
+                    state = compress(state, data, 0, blocks)
+                else:
+                    for offset in range(0, 64 * blocks, 64):
+                        state = compress(state, data, offset)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best / blocks * 1e6)
+
+        report[algorithm] = tuple(timings)
+
+    return report
+# =================================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m crydi.selftest')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--no-bench', action='store_true')
+    args = parser.parse_args(argv)
+
+    backends.set_cross_check(False)
+    known_answers()
+    boundaries()
+    streams()
+    fuzz(args.iterations, args.seed)
+
+    if not args.no_bench:
+        for (algorithm, name), speed in throughput().items():
+            print(f'{algorithm:8} {name:10} {speed:10.3f} MB/s')
+        for algorithm, (single, batched) in block_overhead().items():
+            print(f'{algorithm:8} {"per block":10} {single:10.3f} us, batched {batched:.3f} us')
+
+    print('OK!')
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import queue
+import socket
+import argparse
+import threading
+import socketserver
+from multiprocessing import shared_memory, resource_tracker
+import crydi.hmac as hmac
+import crydi.client as client
+import crydi.metrics as metrics
+import crydi.backends as backends
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+# Maximum number of requests coalesced into one batch
+BATCH_MAX = 256
+
+OPERATIONS = ('digest', 'hmac')
+
+# There are no Unix sockets on every platform (the server can't start there)
+UnixStreamServer = getattr(socketserver, 'UnixStreamServer', socketserver.BaseServer)
+
+# The client only needs the standard library, it lives in crydi.client
+Client = client.Client
+# =================================================================================
+
+# =================================================================================
+# Checks of the incoming requests
+# =================================================================================
+# Reason to reject a header, None if it's valid. Headers without an id or a
+# size can't be answered (or skipped), the connection is closed for them
+def invalid(header):
+    if header.get('op') not in OPERATIONS:
+        return f'Unknown operation ({header.get("op")})'
+    if header.get('algorithm') not in backends.ALGORITHMS:
+        return f'Unknown algorithm ({header.get("algorithm")})'
+    if header['op'] == 'hmac' and not isinstance(header.get('key'), str):
+        return 'Not given key!'
+    if 'shm' in header and not isinstance(header['shm'], str):
+        return 'Invalid shared memory name'
+    return None
+
+def well_formed(header):
+    return (isinstance(header, dict)
+            and type(header.get('id')) is int
+            and type(header.get('size')) is int and header['size'] >= 0)
+
+def attach_shared(name, owner):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 the tracker would unlink the segment of the client
+        # (unless the client is this same process, then it's its own entry)
+        shm = shared_memory.SharedMemory(name=name)
+        if owner != os.getpid():
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+# =================================================================================
+
+# =================================================================================
+# Work done for a request, payload is bytes or a memoryview
+# =================================================================================
+def compute(header, payload):
+    if header['op'] == 'digest':
+        hasher = backends.new(header['algorithm'])
+        hasher.update(payload)
+        return hasher.hexdigest()
+
+    if header['op'] == 'hmac':
+        hasher = hmac.HMAC(header['key'], header['algorithm'], header.get('hex_key', True))
+        hasher.update(payload)
+        return hasher.hexdigest()
+
+    raise RuntimeError(f'Unknown operation ({header["op"]})')
+
+class Request:
+    def __init__(self, header, payload, reply):
+        self.header  = header
+        self.payload = payload
+        self.reply   = reply
+        self.start   = time.perf_counter()
+
+    def finish(self, function, *args):
+        try:
+            self.reply({'id': self.header['id'], 'digest': function(*args)})
+        except Exception as error:
+            self.reply({'id': self.header['id'], 'error': str(error)})
+
+        if metrics.ENABLED:
+            op = self.header.get('op')
+            metrics.observe('crydi_server_latency_seconds', time.perf_counter() - self.start,
+                            op=op if op in OPERATIONS else 'invalid')
+# =================================================================================
+
+# =================================================================================
+# Single worker that coalesces every queued digest request of an algorithm
+# into one call of the batch interface of the backends
+# =================================================================================
+class Batcher(threading.Thread):
+    def __init__(self, max_size=BATCH_MAX):
+        threading.Thread.__init__(self, daemon=True)
+        self.queue    = queue.Queue()
+        self.max_size = max_size
+
+    def submit(self, request):
+        self.queue.put(request)
+
+    def stop(self):
+        self.queue.put(None)
+
+    def run(self):
+        while True:
+            request = self.queue.get()
+            if request is None:
+                return
+
+            # Everything that arrived while the last batch was running
+            batch = [request]
+            while len(batch) < self.max_size:
+                try:
+                    request = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.queue.put(None)
+                    break
+                batch.append(request)
+
+            # Nothing may stop this thread, every client waits on it
+            try:
+                self.process(batch)
+            except Exception as error:
+                for request in batch:
+                    request.reply({'id': request.header['id'], 'error': str(error)})
+
+    def process(self, batch):
+        if metrics.ENABLED:
+            metrics.observe('crydi_server_batch_size', len(batch), metrics.SIZE_BUCKETS)
+
+        groups = {}
+        for request in batch:
+            if request.header['op'] == 'digest':
+                groups.setdefault(request.header['algorithm'], []).append(request)
+            else:
+                request.finish(compute, request.header, request.payload)
+
+        for algorithm, requests in groups.items():
+            try:
+                outputs = backends.digest_many([request.payload for request in requests], algorithm)
+            except Exception:
+                for request in requests:
+                    request.finish(compute, request.header, request.payload)
+                continue
+
+            for request, output in zip(requests, outputs):
+                request.finish(lambda output: output, output)
+# =================================================================================
+
+# =================================================================================
+# Connections are served by one thread each, replies can be sent out of order
+# =================================================================================
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        lock = threading.Lock()
+
+        def reply(message):
+            with lock:
+                try:
+                    self.connection.sendall(client.pack_frame(message))
+                except OSError:
+                    pass
+
+        while True:
+            try:
+                header = client.read_frame(self.rfile)
+            except (EOFError, ValueError):
+                return
+
+            if header is None or not well_formed(header):
+                return
+
+            payload = None
+            if 'shm' not in header:
+                try:
+                    payload = client.read_exact(self.rfile, header['size'])
+                except EOFError:
+                    return
+
+            error = invalid(header)
+            if error is not None:
+                reply({'id': header['id'], 'error': error})
+                continue
+
+            if payload is not None:
+                self.server.batcher.submit(Request(header, payload, reply))
+                continue
+
+            # Big payloads are hashed in place, a batch wouldn't help them
+            try:
+                shm = attach_shared(header['shm'], header.get('pid'))
+            except (OSError, ValueError) as error:
+                reply({'id': header['id'], 'error': f'Cannot attach shared memory ({error})'})
+                continue
+
+            view = shm.buf[:header['size']]
+            try:
+                Request(header, view, reply).finish(compute, header, view)
+            finally:
+                view.release()
+                shm.close()
+
+class Server(socketserver.ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path=None):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError('Unix sockets are not available on this platform')
+
+        # Only a stale socket (nobody answers on it) is replaced
+        path = path or client.default_path()
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)
+            else:
+                raise RuntimeError(f'A server is already listening on {path}')
+            finally:
+                probe.close()
+
+        UnixStreamServer.__init__(self, path, Handler)
+        self.path    = path
+        self.batcher = Batcher()
+        self.batcher.start()
+
+        # Warm the engines so the first requests don't pay the calibration
+        backends.calibrate()
+
+    def server_close(self):
+        UnixStreamServer.server_close(self)
+        self.batcher.stop()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+# =================================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m crydi.server')
+    parser.add_argument('--socket', help='path of the socket (default: one per user in /tmp)')
+    parser.add_argument('--metrics-port', type=int,
+                        help='serve Prometheus metrics on this local port')
+    args = parser.parse_args(argv)
+
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+
+    with Server(args.socket) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,7 +6,7 @@ import crydi.common as common
 # =================================================================================
 BLOCK_SIZE = 64
 
-K = np.array([ 0x5a827999, 0x6ed9eba1, 0x8f1bbcdc, 0xca62c1d6 ], dtype=np.uint32)
+K = tuple(np.uint32(k) for k in [ 0x5a827999, 0x6ed9eba1, 0x8f1bbcdc, 0xca62c1d6 ])
 
 # =================================================================================
 # Auxiliar functions
@@ -19,10 +19,23 @@ def G(b, c, d):
 
 def H(b, c, d):
     return np.uint32((b & c) | (b & d) | (c & d))
+# =================================================================================
+
+# =================================================================================
+# Expand the 80-word schedule of every block at once, word i depends on word
+# i - 3 so it's computed three words at a time for all the blocks together
+# =================================================================================
+def expand_blocks(words):
+    schedule = np.empty((len(words) // 16, 80), dtype=np.uint32)
+    schedule[:, :16] = np.array(words.words_array, dtype=np.uint32).reshape(-1, 16)
+
+    for i in range(16, 80, 3):
+        j     = min(i + 3, 80)
+        value = schedule[:, i - 3:j - 3] ^ schedule[:, i - 8:j - 8] \
+              ^ schedule[:, i - 14:j - 14] ^ schedule[:, i - 16:j - 16]
+        schedule[:, i:j] = (value << np.uint32(1)) | (value >> np.uint32(31))
 
-def expand_word(block, i):
-    value = np.uint32(block[i - 3] ^ block[i - 8] ^ block[i - 14] ^ block[i - 16])
-    return common.rotate_left(value, 1)
+    return schedule
 # =================================================================================
 
 def digest(input_data, hex_input=False, encoding='utf-8'):
@@ -41,11 +54,7 @@ def digest(input_data, hex_input=False, encoding='utf-8'):
     HE = np.uint32(0xc3d2e1f0)
 
     # Iterate over each 512-bit block
-    for i in range(len(input_data) // 16):
-        extended_block = input_data[16 * i:16 * (i + 1)]
-        for i in range(16, 80):
-            extended_block.append(expand_word(extended_block, i))
-
+    for extended_block in expand_blocks(input_data):
         A = HA
         B = HB
         C = HC
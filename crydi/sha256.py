@@ -6,7 +6,7 @@ import crydi.common as common
 # =================================================================================
 BLOCK_SIZE = 64
 
-K = np.array([
+K = tuple(np.uint32(k) for k in [
     0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5,
     0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
     0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3,
@@ -45,11 +45,27 @@ def SSIG0(x):
 
 def SSIG1(x):
     return np.uint32(common.rotate_right(x, 17) ^ common.rotate_right(x, 19) ^ common.shift_right(x, 10))
+# =================================================================================
 
-def expand_word(block, i):
-    s0 = np.uint32(block[i - 16] + SSIG0(block[i - 15]))
-    s1 = np.uint32(block[i -  7] + SSIG1(block[i -  2]))
-    return np.uint32(s0 + s1)
+# =================================================================================
+# Expand the 64-word schedule of every block at once, word i depends on word
+# i - 2 so it's computed two words at a time for all the blocks together
+# =================================================================================
+def rotate_right_array(x, n):
+    return (x >> np.uint32(n)) | (x << np.uint32(32 - n))
+
+def expand_blocks(words):
+    schedule = np.empty((len(words) // 16, 64), dtype=np.uint32)
+    schedule[:, :16] = np.array(words.words_array, dtype=np.uint32).reshape(-1, 16)
+
+    for i in range(16, 64, 2):
+        x  = schedule[:, i - 15:i - 13]
+        s0 = rotate_right_array(x, 7) ^ rotate_right_array(x, 18) ^ (x >> np.uint32(3))
+        x  = schedule[:, i - 2:i]
+        s1 = rotate_right_array(x, 17) ^ rotate_right_array(x, 19) ^ (x >> np.uint32(10))
+        schedule[:, i:i + 2] = schedule[:, i - 16:i - 14] + s0 + schedule[:, i - 7:i - 5] + s1
+
+    return schedule
 # =================================================================================
 
 def digest(input_data, hex_input=False, encoding='utf-8'):
@@ -71,11 +87,7 @@ def digest(input_data, hex_input=False, encoding='utf-8'):
     HH = np.uint32(0x5be0cd19)
 
     # Iterate over each 512-bit block
-    for i in range(len(input_data) // 16):
-        extended_block = input_data[16 * i:16 * (i + 1)]
-        for i in range(16, 64):
-            extended_block.append(expand_word(extended_block, i))
-
+    for extended_block in expand_blocks(input_data):
         A = HA
         B = HB
         C = HC
@@ -0,0 +1,161 @@
+import codecs
+import crydi.hmac as hmac
+import crydi.backends as backends
+
+# =================================================================================
+# Auxiliar variables
+# =================================================================================
+# Blocks in a read, reads are a whole number of 64-byte blocks so the python
+# backend compresses each of them in one call with nothing left to buffer
+BATCH_BLOCKS = 1 << 14
+
+# Size of every read (characters for hex files, bytes otherwise)
+CHUNK_SIZE = 64 * BATCH_BLOCKS
+
+HEX_WHITESPACE = str.maketrans('', '', ' \t\r\n')
+
+# Codecs that encode every character on its own (no BOM, no shift state), a
+# piece of text can be encoded with str.encode without an incremental encoder
+STATELESS_CODECS = {
+    'utf-8', 'ascii', 'latin-1', 'iso8859-1', 'cp1252',
+    'utf-16-le', 'utf-16-be', 'utf-32-le', 'utf-32-be',
+}
+# =================================================================================
+
+# =================================================================================
+# Decode hex text given in chunks. A chunk may end in the middle of a byte, the
+# odd digit is kept until the next chunk, so only one chunk is decoded at a time
+# =================================================================================
+def iter_fromhex(chunks):
+    carry = ''
+    for chunk in chunks:
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = bytes(chunk).decode('ascii')
+
+        chunk = carry + chunk.translate(HEX_WHITESPACE)
+        end   = len(chunk) - len(chunk) % 2
+        carry = chunk[end:]
+
+        if end:
+            yield bytes.fromhex(chunk[:end])
+
+    if carry:
+        raise RuntimeError('Odd number of hexadecimal digits')
+# =================================================================================
+
+# =================================================================================
+# Encode text given in chunks, at most chunk_size characters at a time. Slices
+# of a str always fall between characters, and stateful codecs (utf-16 with
+# its BOM, utf-8-sig...) go through one incremental encoder for the whole text
+# =================================================================================
+def iter_encoded(chunks, encoding='utf-8', chunk_size=CHUNK_SIZE):
+    if isinstance(chunks, str):
+        chunks = [chunks]
+
+    name    = codecs.lookup(encoding).name
+    encoder = None if name in STATELESS_CODECS else codecs.getincrementalencoder(name)()
+
+    for chunk in chunks:
+        if not isinstance(chunk, str):
+            yield chunk
+            continue
+
+        for start in range(0, len(chunk), chunk_size):
+            piece = chunk[start:start + chunk_size]
+            yield piece.encode(name) if encoder is None else encoder.encode(piece)
+
+    if encoder is not None:
+        yield encoder.encode('', final=True)
+# =================================================================================
+
+# =================================================================================
+# Read a file in chunks, in text mode for hex dumps and for text in encoding
+# =================================================================================
+def iter_file(path, chunk_size=CHUNK_SIZE, hex_input=False, encoding=None):
+    if hex_input:
+        file = open(path, 'r', encoding='ascii', newline='')
+    elif encoding is not None:
+        file = open(path, 'r', encoding=encoding, newline='')
+    else:
+        file = open(path, 'rb')
+
+    with file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+# =================================================================================
+
+# =================================================================================
+# Hash an iterable of chunks (text, hex text or bytes) without joining them
+# =================================================================================
+def digest_chunks(chunks, hash_fn, hex_input=False, encoding='utf-8', backend='auto',
+                  chunk_size=CHUNK_SIZE):
+    hasher = backends.new(hash_fn, backend=backend)
+
+    if hex_input:
+        chunks = iter_fromhex(chunks)
+    else:
+        chunks = iter_encoded(chunks, encoding, chunk_size)
+
+    for chunk in chunks:
+        hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+def digest_text(text, hash_fn, encoding='utf-8', backend='auto', chunk_size=CHUNK_SIZE):
+    return digest_chunks(text, hash_fn, encoding=encoding, backend=backend,
+                         chunk_size=chunk_size)
+
+# Raw bytes by default. With source_encoding the file is read as text and
+# hashed as that text encoded in encoding (e.g. a latin-1 file as utf-8)
+def digest_file(path, hash_fn, hex_input=False, chunk_size=CHUNK_SIZE, backend='auto',
+                source_encoding=None, encoding='utf-8'):
+    chunks = iter_file(path, chunk_size, hex_input, source_encoding)
+    return digest_chunks(chunks, hash_fn, hex_input, encoding, backend, chunk_size)
+
+def hmac_file(path, hash_fn, key, hex_input=False, hex_key=True, chunk_size=CHUNK_SIZE,
+              backend='auto'):
+    hasher = hmac.HMAC(key, hash_fn, hex_key, backend=backend)
+    chunks = iter_file(path, chunk_size, hex_input)
+
+    for chunk in iter_fromhex(chunks) if hex_input else chunks:
+        hasher.update(chunk)
+
+    return hasher.hexdigest()
+# =================================================================================
+
+if __name__ == '__main__':
+    assert(b''.join(iter_fromhex(['4', '16', '2 6', '\n3'])) == b'Abc')
+    assert(digest_chunks(['6', '1626', '3'], 'MD5', hex_input=True)
+           == '900150983cd24fb0d6963f7d28e17f72')
+    assert(digest_chunks(['a', 'b', 'c'], 'SHA-1', backend='python')
+           == 'a9993e364706816aba3e25717850c26c9cd0d89d')
+    assert(b''.join(iter_encoded('ñandú' * 3, 'utf-16', chunk_size=2))
+           == ('ñandú' * 3).encode('utf-16'))
+    assert(digest_text('ó', 'MD5', encoding='latin-1')
+           == digest_chunks([b'\xf3'], 'MD5'))
+
+    # Incremental hashing is recorded in the metrics once it's finished
+    import crydi.metrics as metrics
+    metrics.enable()
+    digest_chunks([b'x' * 5000] * 2, 'SHA-256', backend='python')
+    hmac.HMAC('0b' * 16, 'MD5', backend='python').update(b'y' * 300).hexdigest()
+    values = metrics.snapshot()
+    metrics.enable(False)
+
+    assert(values['crydi_bytes_total'][(('algorithm', 'SHA-256'), ('backend', 'python'))]
+           == 10000)
+    assert(values['crydi_bytes_total'][(('algorithm', 'MD5'), ('backend', 'hmac'))] == 300)
+    assert(values['crydi_hmac_total'][(('algorithm', 'MD5'),)] == 1)
+    assert(('crydi_bytes_total', (('algorithm', 'MD5'), ('backend', 'python')))
+           not in metrics.shard().counters)
+
+    import tempfile
+    with tempfile.NamedTemporaryFile('w') as file:
+        file.write('48 69 20 54\n68 65 72 65\n')
+        file.flush()
+        assert(hmac_file(file.name, 'MD5', '0b' * 16, hex_input=True)
+               == '9294727a3638bb1c13f48ef8158bfc9d')
+    print('OK!')
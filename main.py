@@ -1,8 +1,9 @@
+import os
 import sys
 
 from enum import Enum, unique
 from PyQt5 import QtCore, QtWidgets
-from crydi import md4, md5, sha1, sha256, hmac
+from crydi import memo
 from main_ui import Ui_Dialog
 
 @unique
@@ -57,25 +58,29 @@ class MainDialog(QtWidgets.QDialog, Ui_Dialog):
     def processInput(self):
         self.clearOutputValues()
 
+        self.hex_input = self.hexKeyboardCheckBox.isChecked() or self.hexFileCheckBox.isChecked()
+
+        # Files are hashed in chunks straight from disk (as they are, only hex
+        # dumps are read as text), without loading them whole
+        self.path = None
         if self.input == InputType.File:
-            file = QtCore.QFile(self.filenameLine.text())
-            if not file.open(QtCore.QIODevice.ReadOnly):
+            path = self.filenameLine.text()
+            if not os.path.isfile(path) or not os.access(path, os.R_OK):
                 self.infoLabel.setText('Error: no existe el archivo')
                 return
 
-            stream = QtCore.QTextStream(file)
-            self.contents = stream.readAll()
+            self.path = path
         else:
-            self.contents = self.keyboardInputText.toPlainText()
+            self.contents = self.keyboardInputText.toPlainText() or ''
 
-        self.contents  = self.contents or ''
-        self.hex_input = self.hexKeyboardCheckBox.isChecked() or self.hexFileCheckBox.isChecked()
+            if self.hex_input:
+                self.contents = self.contents.replace(' ' ,  '')
+                self.contents = self.contents.replace('\t',  '')
+                self.contents = self.contents.replace('\r', '')
+                self.contents = self.contents.replace('\n',  '')
 
-        if self.hex_input:
-            self.contents = self.contents.replace(' ' ,  '')
-            self.contents = self.contents.replace('\t',  '')
-            self.contents = self.contents.replace('\r', '')
-            self.contents = self.contents.replace('\n',  '')
+            # Fingerprinted once for the digests of every algorithm
+            self.content_key = memo.fingerprint(self.contents)
 
         self.key     = self.keyLine.text()
         self.hex_key = self.hexKeyCheckbox.isChecked()
@@ -87,9 +92,23 @@ class MainDialog(QtWidgets.QDialog, Ui_Dialog):
         self.processSHA256()
         self.processHMAC()
 
+    def computeDigest(self, hash_fn):
+        if self.path is not None:
+            return memo.file_digest(self.path, hash_fn, self.hex_input)
+
+        return memo.digest(self.contents, hash_fn, self.hex_input, content_key=self.content_key)
+
+    def computeHMAC(self):
+        if self.path is not None:
+            return memo.file_hmac_digest(self.path, self.hash_fn, self.key, self.hex_input,
+                                         self.hex_key)
+
+        return memo.hmac_digest(self.contents, self.hash_fn, self.key, self.hex_input,
+                                self.hex_key, content_key=self.content_key)
+
     def processMD4(self):
         try:
-            digest = md4.digest(self.contents, self.hex_input)
+            digest = self.computeDigest('MD4')
         except Exception:
             self.infoLabel.setText('Error: valor hexadecimal inválido')
             return 
@@ -98,7 +117,7 @@ class MainDialog(QtWidgets.QDialog, Ui_Dialog):
 
     def processMD5(self):
         try:
-            digest = md5.digest(self.contents, self.hex_input)
+            digest = self.computeDigest('MD5')
         except Exception:
             self.infoLabel.setText('Error: valor hexadecimal inválido')
             return
@@ -107,7 +126,7 @@ class MainDialog(QtWidgets.QDialog, Ui_Dialog):
 
     def processSHA1(self):
         try:
-            digest = sha1.digest(self.contents, self.hex_input)
+            digest = self.computeDigest('SHA-1')
         except Exception:
             self.infoLabel.setText('Error: valor hexadecimal inválido')
             return
@@ -116,7 +135,7 @@ class MainDialog(QtWidgets.QDialog, Ui_Dialog):
 
     def processSHA256(self):
         try:
-            digest = sha256.digest(self.contents, self.hex_input)
+            digest = self.computeDigest('SHA-256')
         except Exception:
             self.infoLabel.setText('Error: valor hexadecimal inválido')
             return
@@ -128,8 +147,7 @@ class MainDialog(QtWidgets.QDialog, Ui_Dialog):
             return 
 
         try:
-            digest = hmac.digest(self.contents, self.hash_fn, self.key, self.hex_input,
-                                 self.hex_key)
+            digest = self.computeHMAC()
         except Exception:
             self.infoLabel.setText('Error: valor hexadecimal inválido')
             return